@@ -0,0 +1,267 @@
+# account_cache.py
+# Read-through cache of per-user account snapshots (primary account balance, first card's limits),
+# so check_balance and credit_limit, the most frequent intents, are answered without touching the DB.
+#
+# Invalidation is generation based. Every write bumps the user's generation after its commit and
+# drops the snapshot. A reader notes the generation before it queries the database and stores what
+# it loaded only if that generation is still current, so a load that raced a payment can never
+# put the pre-payment balance back.
+#
+# ACCOUNT_CACHE selects the backend:
+#   local   (default) in-process LRU; invalidated by the writes this process makes
+#   sqlite  a small SQLite file shared by every worker on the host (ACCOUNT_CACHE_PATH), so a
+#           payment served by one worker invalidates the snapshot in all of them (serve.py default)
+#   off     always read the database
+import json
+import os
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from database import Account, CreditCard
+
+ACCOUNT_CACHE = os.getenv("ACCOUNT_CACHE", "local")
+ACCOUNT_CACHE_SIZE = int(os.getenv("ACCOUNT_CACHE_SIZE", 100000))
+ACCOUNT_CACHE_PATH = os.getenv("ACCOUNT_CACHE_PATH", "account_cache.db")
+
+
+class AccountSnapshot:
+    """The rows check_balance and credit_limit read, as plain values (Decimal rupees)."""
+    __slots__ = ("balance", "limit_available", "limit_used", "has_account", "has_card")
+
+    def __init__(self, balance=None, limit_available=None, limit_used=None, has_account=False, has_card=False):
+        self.balance = balance
+        self.limit_available = limit_available
+        self.limit_used = limit_used
+        self.has_account = has_account
+        self.has_card = has_card
+
+    def to_json(self):
+        values = {name: getattr(self, name) for name in self.__slots__}
+        for name in ("balance", "limit_available", "limit_used"):
+            if values[name] is not None:
+                values[name] = str(values[name])
+        return json.dumps(values)
+
+    @classmethod
+    def from_json(cls, data):
+        values = json.loads(data)
+        for name in ("balance", "limit_available", "limit_used"):
+            if values[name] is not None:
+                values[name] = Decimal(values[name])
+        return cls(**values)
+
+
+async def load_snapshots(db, user_ids):
+    """Snapshots straight from the database: one IN (...) query per table."""
+    snapshots = {user_id: AccountSnapshot() for user_id in user_ids}
+    accounts = await db.execute(select(Account.user_id, Account.balance)
+                                .where(Account.user_id.in_(user_ids)).order_by(Account.id))
+    for user_id, balance in accounts:
+        snapshot = snapshots[user_id]
+        if not snapshot.has_account:
+            snapshot.has_account, snapshot.balance = True, balance
+    cards = await db.execute(select(CreditCard.user_id, CreditCard.limit_available, CreditCard.limit_used)
+                             .where(CreditCard.user_id.in_(user_ids)).order_by(CreditCard.id))
+    for user_id, available, used in cards:
+        snapshot = snapshots[user_id]
+        if not snapshot.has_card:
+            snapshot.has_card, snapshot.limit_available, snapshot.limit_used = True, available, used
+    return snapshots
+
+
+class LocalBackend:
+    """
+    In-process LRU of user_id -> [generation, snapshot or None]. Generations come from one counter;
+    a user without an entry is at the highest generation evicted so far, so an eviction can never
+    make an invalidated user look unchanged to a reader that started before the invalidation.
+    """
+    def __init__(self, max_size=ACCOUNT_CACHE_SIZE):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._counter = 0
+        self._evicted = 0
+
+    def read(self, user_id):
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is None:
+                return self._evicted, None
+            self._data.move_to_end(user_id)
+            return entry[0], entry[1]
+
+    def store(self, user_id, generation, snapshot):
+        with self._lock:
+            entry = self._data.get(user_id)
+            if (entry[0] if entry else self._evicted) != generation:
+                return False
+            self._put(user_id, [generation, snapshot])
+            return True
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._counter += 1
+            self._put(user_id, [self._counter, None])
+
+    def clear(self):
+        with self._lock:
+            self._counter += 1
+            self._evicted = self._counter
+            self._data.clear()
+
+    def _put(self, user_id, entry):
+        self._data[user_id] = entry
+        self._data.move_to_end(user_id)
+        while len(self._data) > self.max_size:
+            _, (generation, _) = self._data.popitem(last=False)
+            self._evicted = max(self._evicted, generation)
+
+    def stats(self):
+        return {"backend": "local", "size": len(self._data), "max_size": self.max_size}
+
+
+class SQLiteBackend:
+    """
+    Shared by the processes on one host through a local SQLite file (WAL: readers never block).
+    Rows are never deleted, only emptied, so their generations only move forward.
+    """
+    def __init__(self, path=ACCOUNT_CACHE_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        # One connection per thread and process (connections must not cross a fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS snapshots "
+                         "(user_id INTEGER PRIMARY KEY, generation INTEGER NOT NULL, data TEXT)")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def read(self, user_id):
+        row = self._conn().execute("SELECT generation, data FROM snapshots WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None:
+            return 0, None
+        return row[0], (AccountSnapshot.from_json(row[1]) if row[1] else None)
+
+    def store(self, user_id, generation, snapshot):
+        cursor = self._conn().execute(
+            "INSERT INTO snapshots (user_id, generation, data) VALUES (?, ?, ?) "
+            "ON CONFLICT (user_id) DO UPDATE SET data = excluded.data WHERE generation = excluded.generation",
+            (user_id, generation, snapshot.to_json()))
+        return cursor.rowcount == 1
+
+    def invalidate(self, user_id):
+        self._conn().execute(
+            "INSERT INTO snapshots (user_id, generation, data) VALUES (?, 1, NULL) "
+            "ON CONFLICT (user_id) DO UPDATE SET generation = generation + 1, data = NULL", (user_id,))
+
+    def clear(self):
+        self._conn().execute("UPDATE snapshots SET generation = generation + 1, data = NULL")
+
+    def stats(self):
+        cached = self._conn().execute("SELECT COUNT(*) FROM snapshots WHERE data IS NOT NULL").fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "size": cached}
+
+
+class AccountCache:
+    def __init__(self, backend=None):
+        self.backend = backend  # None = disabled
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.raced = 0  # loads not stored because a write landed while they ran
+
+    async def snapshots(self, db, user_ids):
+        """{user_id: AccountSnapshot}; only the users missing from the cache are read from `db`."""
+        user_ids = list(set(user_ids))
+        if self.backend is None:
+            return await load_snapshots(db, user_ids)
+        found, generations = {}, {}
+        for user_id in user_ids:
+            generation, snapshot = self.backend.read(user_id)
+            if snapshot is None:
+                generations[user_id] = generation
+            else:
+                found[user_id] = snapshot
+        self.hits += len(found)
+        self.misses += len(generations)
+        if generations:
+            loaded = await load_snapshots(db, list(generations))
+            for user_id, snapshot in loaded.items():
+                if not self.backend.store(user_id, generations[user_id], snapshot):
+                    self.raced += 1
+            found.update(loaded)
+        return found
+
+    def invalidate(self, user_id):
+        """Call after committing a write to the user's accounts or cards."""
+        if self.backend is not None:
+            self.backend.invalidate(user_id)
+            self.invalidations += 1
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        stats = self.backend.stats() if self.backend is not None else {"backend": "off"}
+        stats.update({"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations,
+                      "raced": self.raced, "hit_rate": round(self.hits / total, 4) if total else 0.0})
+        return stats
+
+
+def make_backend(kind=ACCOUNT_CACHE):
+    if kind == "off":
+        return None
+    if kind == "sqlite":
+        return SQLiteBackend()
+    return LocalBackend()
+
+
+# Singleton instance
+account_cache = AccountCache(make_backend())
+
+
+# ORM writers (seeding, admin scripts, future endpoints) invalidate automatically: users whose
+# Account or CreditCard rows a session flushed are invalidated once that session commits.
+# Core statements bypass this; ledger.py invalidates its debits itself.
+@event.listens_for(Session, "after_flush")
+def _collect_account_writes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (Account, CreditCard)) and obj.user_id is not None:
+            session.info.setdefault("account_cache_users", set()).add(obj.user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_account_writes(session):
+    for user_id in session.info.pop("account_cache_users", ()):
+        account_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_account_writes(session, previous_transaction):
+    session.info.pop("account_cache_users", None)
+
+
+if __name__ == "__main__":
+    # python account_cache.py clear        (after changing balances outside the app, with ACCOUNT_CACHE=sqlite)
+    # python account_cache.py invalidate <user_id>
+    if sys.argv[1:2] == ["clear"]:
+        account_cache.clear()
+        print("✅ Account snapshot cache cleared")
+    elif sys.argv[1:2] == ["invalidate"]:
+        account_cache.invalidate(int(sys.argv[2]))
+        print(f"✅ Account snapshot of user {sys.argv[2]} invalidated")
+    else:
+        print(json.dumps(account_cache.stats(), indent=2))
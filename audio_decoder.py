@@ -0,0 +1,161 @@
+# audio_decoder.py
+# Turns uploaded audio bytes into a 16 kHz mono float32 NumPy buffer without touching disk.
+import io
+import os
+import subprocess
+import tempfile
+
+import numpy as np
+import soundfile as sf
+
+try:
+    import av  # PyAV: optional in-process decoder for webm/opus/mp3
+except ImportError:
+    av = None
+
+SAMPLE_RATE = 16000
+# Uploads above this size are spooled to a uniquely named temp file instead of held in RAM
+SPOOL_THRESHOLD_BYTES = int(os.getenv("AUDIO_SPOOL_THRESHOLD_BYTES", 25 * 1024 * 1024))
+
+
+class AudioDecodeError(Exception):
+    pass
+
+
+class AudioFrame:
+    """
+    Canonical decoded utterance: 16 kHz mono float32, decoded and resampled exactly once.
+    The same frame is handed to speaker verification and to Whisper; consumers must treat
+    `samples` as read-only and copy before modifying it in place.
+    """
+    def __init__(self, samples, sample_rate=SAMPLE_RATE, source=None):
+        if sample_rate != SAMPLE_RATE:
+            raise ValueError(f"AudioFrame must be {SAMPLE_RATE} Hz, got {sample_rate}")
+        self.samples = np.ascontiguousarray(samples, dtype=np.float32)
+        self.sample_rate = sample_rate
+        self.source = source  # which decoder produced it: soundfile / pyav / ffmpeg
+
+    @property
+    def duration(self):
+        return len(self.samples) / self.sample_rate
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __repr__(self):
+        return f"AudioFrame({self.duration:.2f}s, {self.sample_rate} Hz, source={self.source})"
+
+
+def _to_mono_16k(audio, sr):
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    if sr != SAMPLE_RATE:
+        # librosa is slow to import and only needed for non-16 kHz input
+        import librosa
+        audio = librosa.resample(audio, orig_sr=sr, target_sr=SAMPLE_RATE)
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+
+def _decode_soundfile(data):
+    # WAV / FLAC / OGG are handled by libsndfile directly from memory
+    try:
+        audio, sr = sf.read(io.BytesIO(data), dtype="float32", always_2d=False)
+    except Exception:
+        return None
+    return _to_mono_16k(audio, sr)
+
+
+def _decode_pyav(source):
+    if av is None:
+        return None
+    try:
+        with av.open(source) as container:
+            resampler = av.AudioResampler(format="flt", layout="mono", rate=SAMPLE_RATE)
+            chunks = []
+            for frame in container.decode(audio=0):
+                for out in resampler.resample(frame):
+                    chunks.append(out.to_ndarray().reshape(-1))
+            for out in resampler.resample(None):  # flush
+                chunks.append(out.to_ndarray().reshape(-1))
+    except Exception:
+        return None
+    if not chunks:
+        return None
+    return np.ascontiguousarray(np.concatenate(chunks), dtype=np.float32)
+
+
+def _decode_ffmpeg(input_arg, stdin_data=None):
+    # ffmpeg writes raw float32 PCM to stdout; nothing is written to disk
+    cmd = ["ffmpeg", "-loglevel", "error"]
+    if stdin_data is None:
+        cmd.append("-nostdin")
+    cmd += [
+        "-i", input_arg,
+        "-vn", "-f", "f32le", "-acodec", "pcm_f32le",
+        "-ac", "1", "-ar", str(SAMPLE_RATE),
+        "pipe:1",
+    ]
+    try:
+        proc = subprocess.run(cmd, input=stdin_data, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except Exception as e:
+        raise AudioDecodeError(f"FFmpeg error: {str(e)}")
+    if proc.returncode != 0 or not proc.stdout:
+        raise AudioDecodeError(f"FFmpeg failed: {proc.stderr.decode(errors='ignore').strip()[:200]}")
+    return np.frombuffer(proc.stdout, dtype=np.float32).copy()
+
+
+def decode_bytes(data):
+    """Decodes an in-memory upload to an AudioFrame (16 kHz mono float32)."""
+    if not data:
+        raise AudioDecodeError("Empty audio upload.")
+
+    source = "soundfile"
+    audio = _decode_soundfile(data)
+    if audio is None:
+        source = "pyav"
+        audio = _decode_pyav(io.BytesIO(data))
+    if audio is None:
+        source = "ffmpeg"
+        audio = _decode_ffmpeg("pipe:0", stdin_data=data)
+    if audio.size == 0:
+        raise AudioDecodeError("Audio upload contained no samples.")
+    return AudioFrame(audio, source=source)
+
+
+def decode_file(path):
+    """Decodes audio that already lives on disk (large spooled uploads)."""
+    source = "pyav"
+    audio = _decode_pyav(path)
+    if audio is None:
+        source = "ffmpeg"
+        audio = _decode_ffmpeg(path)
+    if audio.size == 0:
+        raise AudioDecodeError("Audio upload contained no samples.")
+    return AudioFrame(audio, source=source)
+
+
+def decode_upload(file_obj):
+    """
+    Decodes a file-like upload (e.g. UploadFile.file) into an AudioFrame.
+    Small uploads are decoded straight from memory; very large ones are spooled to a
+    uniquely named temp file so they are never held in RAM twice.
+    """
+    file_obj.seek(0, os.SEEK_END)
+    size = file_obj.tell()
+    file_obj.seek(0)
+
+    if size <= SPOOL_THRESHOLD_BYTES:
+        return decode_bytes(file_obj.read())
+
+    spool = tempfile.NamedTemporaryFile(prefix="upload_", suffix=".audio", delete=False)
+    try:
+        with spool:
+            while True:
+                block = file_obj.read(1024 * 1024)
+                if not block:
+                    break
+                spool.write(block)
+        return decode_file(spool.name)
+    finally:
+        if os.path.exists(spool.name):
+            os.remove(spool.name)
@@ -0,0 +1,102 @@
+# bench_account_cache.py
+# DB round trips per request for check_balance / credit_limit traffic, with and without the
+# account snapshot cache (account_cache.py), on a scratch SQLite database.
+#
+#   python bench_account_cache.py [requests] [payment_percent]
+#
+# Requests go through main.route_to_db like /chat does. Every balance answer is checked against
+# the database, so a snapshot that outlived a payment fails the run.
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+SCRATCH_DIR = tempfile.mkdtemp(prefix="account-cache-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(SCRATCH_DIR, 'bank.db')}"
+os.environ["ACCOUNT_CACHE_PATH"] = os.path.join(SCRATCH_DIR, "account_cache.db")
+
+from sqlalchemy import event, select  # noqa: E402
+
+import database  # noqa: E402
+from database import Account, CreditCard, User  # noqa: E402
+from account_cache import account_cache, make_backend  # noqa: E402
+import main  # noqa: E402
+from response_templates import render  # noqa: E402
+
+USERS = 50
+
+
+class RoundTrips:
+    """Counts statements sent to the database by the API and ledger engines."""
+    def __init__(self):
+        self.count = 0
+        for engine in (database.async_engine.sync_engine, database.ledger_engine.sync_engine):
+            event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def seed():
+    database.Base.metadata.create_all(bind=database.engine)
+    db = database.get_db_session()
+    try:
+        for i in range(1, USERS + 1):
+            db.add(User(id=i, name=f"Bench {i}"))
+            db.add(Account(user_id=i, account_number=f"80000000{i:02d}", balance=100000))
+            db.add(CreditCard(user_id=i, card_name="Bench Card", limit_available=50000, limit_used=1000))
+        db.commit()
+    finally:
+        db.close()
+
+
+async def current_balance(user_id):
+    async with database.AsyncSessionLocal() as db:
+        return await db.scalar(select(Account.balance).where(Account.user_id == user_id).order_by(Account.id).limit(1))
+
+
+async def run(requests, payment_percent, round_trips):
+    rng = random.Random(11)
+    # Every user is mapped to their own row: route_to_db takes the db id from resolve_db_id
+    main.resolve_db_id = lambda user_id: user_id
+    reads = counted = 0
+    elapsed = 0.0
+    for i in range(requests):
+        user_id = rng.randint(1, USERS)
+        if rng.random() * 100 < payment_percent:
+            intent, slots = "make_payment", {"amount": f"{rng.randint(1, 500)}.{rng.randint(0, 99):02d} rupees"}
+        else:
+            intent, slots = rng.choice(["check_balance", "credit_limit"]), {}
+        before = round_trips.count
+        start = time.perf_counter()
+        async with database.AsyncSessionLocal() as db:
+            response = await main.route_to_db(intent, slots, None, user_id, db)
+        elapsed += time.perf_counter() - start
+        if intent != "make_payment":
+            reads += 1
+            counted += round_trips.count - before
+        if intent == "check_balance":
+            # Outside the measurement: the answer must match the committed balance
+            expected = render("check_balance", None, "en-US", balance=await current_balance(user_id))
+            assert response == expected, f"stale balance for user {user_id}: {response!r} != {expected!r}"
+    return reads, counted, elapsed
+
+
+async def main_async(requests, payment_percent):
+    seed()
+    round_trips = RoundTrips()
+    for kind in ("off", "local", "sqlite"):
+        account_cache.backend = make_backend(kind)
+        account_cache.hits = account_cache.misses = account_cache.invalidations = account_cache.raced = 0
+        reads, counted, elapsed = await run(requests, payment_percent, round_trips)
+        print(f"✅ cache {kind:<7} {counted / reads:5.2f} DB round trips per read request, "
+              f"{requests / elapsed:,.0f} req/s  {account_cache.stats()}")
+    await database.async_engine.dispose()
+    await database.ledger_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main_async(int(sys.argv[1]) if len(sys.argv) > 1 else 5000,
+                           float(sys.argv[2]) if len(sys.argv) > 2 else 2))
@@ -0,0 +1,57 @@
+# bench_features.py
+# Benchmarks the CRF featurizers on slot_filling_train.conll and checks they are equivalent.
+#   python bench_features.py
+import os
+import pickle
+import timeit
+
+from token_feature import sent2features, sent2features_fast, tokens2crfsuite
+
+
+def load_sentences(file_path="slot_filling_train.conll"):
+    # Same format as slotfill.load_custom_conll: "token label token label ..." per line
+    sentences = []
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            splits = line.split()
+            if splits:
+                sentences.append([(splits[i], splits[i + 1]) for i in range(0, len(splits), 2)])
+    return sentences
+
+
+def main(repeat=200):
+    sentences = load_sentences()
+    token_lists = [[tok for tok, _ in s] for s in sentences]
+
+    # 1. Identical output
+    for s in sentences:
+        assert sent2features_fast(s) == sent2features(s), f"Feature mismatch on: {s}"
+    print(f"✅ sent2features_fast matches sent2features on {len(sentences)} sentences")
+
+    # 2. Speed
+    def run(fn, data):
+        return min(timeit.repeat(lambda: [fn(x) for x in data], number=repeat, repeat=3)) / repeat
+
+    base = run(sent2features, sentences)
+    fast = run(sent2features_fast, sentences)
+    compact = run(tokens2crfsuite, token_lists)
+    print(f"sent2features       {base * 1000:8.3f} ms / pass")
+    print(f"sent2features_fast  {fast * 1000:8.3f} ms / pass  ({base / fast:.2f}x)")
+    print(f"tokens2crfsuite     {compact * 1000:8.3f} ms / pass  ({base / compact:.2f}x)")
+
+    # 3. Same tags from the trained model (needs slot_filling_crf_model.pkl from slotfill.py)
+    if os.path.exists("slot_filling_crf_model.pkl"):
+        with open("slot_filling_crf_model.pkl", "rb") as f:
+            crf = pickle.load(f)
+        tagger = crf.tagger_
+        for s, tokens in zip(sentences, token_lists):
+            assert tagger.tag(tokens2crfsuite(tokens)) == crf.predict_single(sent2features(s)), f"Tag mismatch on: {tokens}"
+        print(f"✅ tokens2crfsuite gives identical tags on {len(sentences)} sentences")
+
+        dict_tag = run(lambda s: crf.predict_single(sent2features(s)), sentences)
+        fast_tag = run(lambda t: tagger.tag(tokens2crfsuite(t)), token_lists)
+        print(f"featurize + tag: dicts {dict_tag * 1000:.3f} ms, compact {fast_tag * 1000:.3f} ms ({dict_tag / fast_tag:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,81 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey, LargeBinary
+import datetime
+import os
+
+from sqlalchemy import create_engine, event, Column, Date, Index, Integer, String, ForeignKey, LargeBinary, Text, inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, relationship, declarative_base
 from pydantic import BaseModel
 from sqlalchemy.orm import Session # Added for type hinting
 
+from money import Money # Amounts: integer paise in the DB, Decimal rupees in Python
+
 # --- 1. DATABASE CONFIGURATION ---
-DATABASE_URL = "sqlite:///./banking_assistant.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./banking_assistant.db")
+
+# Same database through an asyncio driver (pip install aiosqlite, or asyncpg for Postgres)
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+def async_url(url):
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", async_url(DATABASE_URL))
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# Connection pool of the async engine used by the API (the sync engine serves scripts and worker threads)
+POOL_OPTIONS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", 10)),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 20)),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", 10)),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+    "pool_pre_ping": not IS_SQLITE,
+}
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if IS_SQLITE else {})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **POOL_OPTIONS)
+# expire_on_commit=False: rows stay readable after commit without another (awaited) round trip
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# SQLite: WAL lets readers run alongside the writer, synchronous=NORMAL fsyncs at checkpoints
+# instead of on every commit, and busy_timeout makes writers wait for the lock instead of failing
+SQLITE_WAL = os.getenv("SQLITE_WAL", "1") == "1"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    if SQLITE_WAL:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+# Money movement (ledger.py) gets its own engine. On SQLite its transactions start with
+# BEGIN IMMEDIATE: the write lock is taken up front, so concurrent writers queue on busy_timeout
+# instead of failing on a stale read snapshot, and SAVEPOINTs nest inside a real transaction
+# (pysqlite's implicit BEGIN handling is switched off for it, see the SQLAlchemy aiosqlite docs).
+# SQLite has one writer at a time anyway, so each process gets a single ledger connection: payments
+# queue for it in the pool instead of up to pool_size + max_overflow connections racing for the
+# lock and failing with "database is locked" once SQLITE_BUSY_TIMEOUT_MS runs out
+LEDGER_POOL_OPTIONS = {**POOL_OPTIONS, "pool_size": 1, "max_overflow": 0} if IS_SQLITE else POOL_OPTIONS
+ledger_engine = create_async_engine(ASYNC_DATABASE_URL, **LEDGER_POOL_OPTIONS)
+LedgerSessionLocal = async_sessionmaker(ledger_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+def _ledger_connect(dbapi_connection, connection_record):
+    _sqlite_pragmas(dbapi_connection, connection_record)
+    dbapi_connection.isolation_level = None
+
+def _ledger_begin(conn):
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+if IS_SQLITE:
+    event.listen(engine, "connect", _sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _sqlite_pragmas)
+    event.listen(ledger_engine.sync_engine, "connect", _ledger_connect)
+    event.listen(ledger_engine.sync_engine, "begin", _ledger_begin)
+
 # Dependency to get DB session (for FastAPI routes)
 def get_db():
     db = SessionLocal()
@@ -18,6 +84,15 @@ def get_db():
     finally:
         db.close()
 
+# Async dependency for the API endpoints: queries are awaited instead of blocking the event loop
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def pool_stats():
+    pool = async_engine.pool
+    return {"status": pool.status(), "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None}
+
 # Helper to get a standalone DB session (for scripts like registration/security)
 def get_db_session() -> Session:
     """Returns a standalone database session for scripts (not FastAPI dependencies)."""
@@ -32,6 +107,8 @@ class User(Base):
     name = Column(String, index=True)
     # Storing the voice embedding (numpy array) as binary data
     voice_embedding = Column(LargeBinary, nullable=True) 
+    # Bumped on every enrollment so caches of the embedding can tell they are stale
+    voice_embedding_version = Column(Integer, nullable=False, default=0, server_default="0")
     
     # Relationships
     accounts = relationship("Account", back_populates="owner")
@@ -44,7 +121,7 @@ class Account(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     account_number = Column(String, unique=True, index=True)
-    balance = Column(Float)
+    balance = Column(Money)
     
     owner = relationship("User", back_populates="accounts")
 
@@ -54,7 +131,7 @@ class Loan(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     loan_type = Column(String)
     status = Column(String) # E.g., Approved, Pending, Rejected
-    amount = Column(Float)
+    amount = Column(Money)
     
     owner = relationship("User", back_populates="loans")
 
@@ -63,8 +140,8 @@ class CreditCard(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     card_name = Column(String)
-    limit_available = Column(Float)
-    limit_used = Column(Float)
+    limit_available = Column(Money)
+    limit_used = Column(Money)
     
     owner = relationship("User", back_populates="credit_cards")
 
@@ -72,12 +149,39 @@ class Transaction(Base):
     __tablename__ = "transactions"
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    transaction_date = Column(String) # Keeping as string for simplicity in demo
+    transaction_date = Column(Date)
     description = Column(String)
-    amount = Column(Float)
+    amount = Column(Money)
+    transaction_type = Column(String, default="Debit") # Debit / Credit
+    category = Column(String, nullable=True) # spending.categorize(description), e.g. "Amazon"
     
     owner = relationship("User", back_populates="transactions")
 
+    # History queries are "this user's rows in a date range, newest first": one index range scan,
+    # with id as the tie-breaker for keyset pagination (see transactions.py)
+    __table_args__ = (Index("ix_transactions_user_date", "user_id", "transaction_date", "id"),)
+
+class IdempotencyKey(Base):
+    """Written in the same transaction as the payment it guards, so a key exists only for committed payments"""
+    __tablename__ = "idempotency_keys"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    key = Column(String, primary_key=True)
+    created_at = Column(String)
+    response = Column(Text) # JSON of the ledger result, replayed on retries
+
+class SpendingRollup(Base):
+    """
+    Debit totals per user, category and day/month, kept up to date by the ledger in the same
+    transaction as each payment (see spending.py). category "*" is the total over all categories.
+    """
+    __tablename__ = "spending_rollups"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    category = Column(String, primary_key=True)
+    period = Column(String, primary_key=True) # "day" / "month"
+    period_start = Column(Date, primary_key=True)
+    total = Column(Money, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
+
 # --- 3. Pydantic Schemas (for FastAPI request/response) ---
 class UserBase(BaseModel):
     name: str
@@ -85,7 +189,8 @@ class UserBase(BaseModel):
 class UserCreate(UserBase):
     pass
 
-class User(UserBase):
+# Named UserSchema so it does not shadow the User table model above
+class UserSchema(UserBase):
     id: int
     voice_embedding: bytes | None
     
@@ -93,8 +198,80 @@ class User(UserBase):
         from_attributes = True
 
 # --- 4. INITIALIZE EXAMPLE DATA ---
+# Columns added after the first release; create_all() does not alter existing tables
+ADDED_COLUMNS = {
+    "users": {
+        "voice_embedding_version": "INTEGER NOT NULL DEFAULT 0",
+    },
+    "transactions": {
+        "transaction_type": "VARCHAR DEFAULT 'Debit'",
+        "category": "VARCHAR",
+    },
+}
+
+# Columns whose type changed. SQLite needs no rewrite: the old values already are the ISO
+# strings SQLAlchemy stores for Date there; other databases convert the column in place.
+RETYPED_COLUMNS = {
+    "transactions": {
+        "transaction_date": "DATE",
+    },
+}
+
+# Amounts that used to be FLOAT rupees and are now integer paise (money.Money)
+MONEY_COLUMNS = {
+    "accounts": ["balance"],
+    "loans": ["amount"],
+    "credit_cards": ["limit_available", "limit_used"],
+    "transactions": ["amount"],
+}
+# SQLite keeps the declared FLOAT type after the conversion, so PRAGMA user_version records it
+SQLITE_SCHEMA_VERSION = 1
+
+def migrate_money(conn, inspector):
+    """Rescales MONEY_COLUMNS from rupees to paise, once."""
+    if IS_SQLITE and conn.exec_driver_sql("PRAGMA user_version").scalar() >= SQLITE_SCHEMA_VERSION:
+        return
+    for table, columns in MONEY_COLUMNS.items():
+        if not inspector.has_table(table):
+            continue
+        types = {c["name"]: str(c["type"]).upper() for c in inspector.get_columns(table)}
+        for name in columns:
+            if name not in types or "INT" in types[name]:
+                continue
+            if IS_SQLITE:
+                conn.execute(text(f"UPDATE {table} SET {name} = CAST(ROUND({name} * 100) AS INTEGER)"))
+            else:
+                conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {name} TYPE BIGINT USING ROUND({name} * 100)::BIGINT"))
+    if IS_SQLITE:
+        conn.exec_driver_sql(f"PRAGMA user_version = {SQLITE_SCHEMA_VERSION}")
+
+def migrate_columns():
+    """Adds missing ADDED_COLUMNS, retypes RETYPED_COLUMNS, converts MONEY_COLUMNS and creates missing indexes."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, columns in ADDED_COLUMNS.items():
+            if not inspector.has_table(table):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table)}
+            for name, ddl in columns.items():
+                if name not in existing:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+        if not IS_SQLITE:
+            for table, columns in RETYPED_COLUMNS.items():
+                if not inspector.has_table(table):
+                    continue
+                types = {c["name"]: str(c["type"]).upper() for c in inspector.get_columns(table)}
+                for name, ddl in columns.items():
+                    if name in types and types[name] != ddl:
+                        conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {name} TYPE {ddl} USING {name}::{ddl}"))
+        migrate_money(conn, inspector)
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+
 def init_db():
     Base.metadata.create_all(bind=engine)
+    migrate_columns()
     db = SessionLocal()
     
     # Check if data exists, if not, add dummy data
@@ -118,9 +295,9 @@ def init_db():
         db.add(CreditCard(user_id=user.id, card_name="HDFC Regalia", limit_available=80000.0, limit_used=20000.0))
         
         # ADDED: Example Transactions for User ID 1
-        db.add(Transaction(user_id=user.id, transaction_date="2025-11-20", description="Online Purchase - Amazon", amount=1500.00))
-        db.add(Transaction(user_id=user.id, transaction_date="2025-11-21", description="ATM Withdrawal", amount=5000.00))
-        db.add(Transaction(user_id=user.id, transaction_date="2025-11-22", description="Salary Deposit", amount=45000.00))
+        db.add(Transaction(user_id=user.id, transaction_date=datetime.date(2025, 11, 20), description="Online Purchase - Amazon", amount=1500.00, transaction_type="Debit"))
+        db.add(Transaction(user_id=user.id, transaction_date=datetime.date(2025, 11, 21), description="ATM Withdrawal", amount=5000.00, transaction_type="Debit"))
+        db.add(Transaction(user_id=user.id, transaction_date=datetime.date(2025, 11, 22), description="Salary Deposit", amount=45000.00, transaction_type="Credit"))
 
         db.commit()
         print("✅ DB populated with dummy data for User ID 1.")
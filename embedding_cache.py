@@ -0,0 +1,91 @@
+# embedding_cache.py
+# Process-level cache of enrolled voice embeddings, keeps DB + np.load off the verification path.
+import os
+import time
+
+import numpy as np
+from numpy.linalg import norm
+
+from cache import LRUCache
+from database import User, get_db_session
+from embedding_codec import decode_embedding
+
+# How often a cached entry re-checks users.voice_embedding_version (a tiny indexed read, no blob).
+# Registration runs as a separate script, so this is how a new enrollment reaches the server.
+REVALIDATE_SECONDS = float(os.getenv("EMBEDDING_REVALIDATE_SECONDS", 5))
+
+
+def deserialize_embedding(binary_data):
+    """Converts binary data from the database back to a numpy array (embedding)."""
+    # Zero-copy view for the compact format; legacy np.save blobs still decode
+    return decode_embedding(binary_data)
+
+
+class _Entry:
+    __slots__ = ("version", "vector", "checked_at")
+
+    def __init__(self, version, vector):
+        self.version = version
+        self.vector = vector
+        self.checked_at = time.monotonic()
+
+
+class EmbeddingCache:
+    """
+    user id -> pre-normalized float32 embedding, LRU bounded.
+    Entries are keyed on users.voice_embedding_version, which registeration.py bumps on every
+    write; a changed version (or an explicit invalidate) forces a reload.
+    """
+    def __init__(self, max_size=10000, revalidate_seconds=REVALIDATE_SECONDS):
+        self._lru = LRUCache(max_size)
+        self.revalidate_seconds = revalidate_seconds
+
+    def _load(self, user_id):
+        db = get_db_session()
+        try:
+            user = db.query(User).filter(User.id == user_id).first()
+            if not user:
+                return None, f"Error: User ID {user_id} not found in database."
+            if not user.voice_embedding:
+                return None, "No reference voice embedding found in database."
+            vector = deserialize_embedding(user.voice_embedding).astype(np.float32)
+            vector /= norm(vector)
+            entry = _Entry(user.voice_embedding_version or 0, vector)
+        finally:
+            db.close()
+        self._lru.put(user_id, entry)
+        return entry, None
+
+    def _current_version(self, user_id):
+        db = get_db_session()
+        try:
+            row = db.query(User.voice_embedding_version).filter(User.id == user_id).first()
+        finally:
+            db.close()
+        return None if row is None else (row[0] or 0)
+
+    def lookup(self, user_id):
+        """Returns (normalized_embedding, None) or (None, error_message)."""
+        entry = self._lru.get(user_id)
+        if entry is not None and time.monotonic() - entry.checked_at >= self.revalidate_seconds:
+            if self._current_version(user_id) == entry.version:
+                entry.checked_at = time.monotonic()
+            else:
+                self._lru.pop(user_id)
+                entry = None
+        if entry is None:
+            entry, error = self._load(user_id)
+            if entry is None:
+                return None, error
+        return entry.vector, None
+
+    def invalidate(self, user_id):
+        """Drops a user's entry; call after writing a new embedding in this process."""
+        self._lru.pop(user_id)
+
+    def stats(self):
+        return self._lru.stats()
+
+
+# Singleton instance
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,90 @@
+# embedding_codec.py
+# Compact storage format for voice embeddings (users.voice_embedding).
+#
+# Layout: 8-byte header + raw little-endian vector
+#   0..3  magic b"VEMB"
+#   4     format version (1)
+#   5     dtype code: 1 = float32, 2 = float16
+#   6..7  dimension, uint16 little-endian
+# The 8-byte header keeps the payload aligned, so readers get a zero-copy np.frombuffer view.
+import io
+import struct
+import sys
+
+import numpy as np
+
+MAGIC = b"VEMB"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sBBH")
+HEADER_SIZE = HEADER.size  # 8
+
+DTYPES = {1: np.dtype("<f4"), 2: np.dtype("<f2")}
+DTYPE_CODES = {"float32": 1, "float16": 2}
+
+NPY_MAGIC = b"\x93NUMPY"  # blobs written by the old np.save based serializer
+
+
+def encode_embedding(embedding, dtype="float32"):
+    """Vector -> header + raw little-endian float32 (or float16) bytes."""
+    code = DTYPE_CODES[dtype]
+    vector = np.ascontiguousarray(np.asarray(embedding).reshape(-1), dtype=DTYPES[code])
+    return HEADER.pack(MAGIC, FORMAT_VERSION, code, vector.shape[0]) + vector.tobytes()
+
+
+def decode_embedding(blob):
+    """
+    Bytes -> 1-D array. New-format blobs are returned as a read-only view over `blob`
+    (no copy); legacy np.save blobs are still accepted.
+    """
+    if not blob:
+        return None
+    if blob[:4] == MAGIC:
+        magic, version, code, dim = HEADER.unpack_from(blob)
+        if version != FORMAT_VERSION or code not in DTYPES:
+            raise ValueError(f"Unsupported embedding blob (version={version}, dtype={code})")
+        return np.frombuffer(blob, dtype=DTYPES[code], count=dim, offset=HEADER_SIZE)
+    if blob[:6] == NPY_MAGIC:
+        with io.BytesIO(blob) as f:
+            return np.load(f)
+    raise ValueError("Unrecognized embedding blob format.")
+
+
+def decode_matrix(blobs):
+    """Decodes many blobs into one (n, dim) float32 matrix, for bulk loading at startup."""
+    vectors = [decode_embedding(b) for b in blobs]
+    if not vectors:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.vstack(vectors).astype(np.float32, copy=False)
+
+
+def is_legacy(blob):
+    return bool(blob) and blob[:6] == NPY_MAGIC
+
+
+def migrate_embeddings(dtype="float32"):
+    """Rewrites every legacy np.save blob (or every blob, if the dtype changes) in the new format."""
+    from database import User, get_db_session
+
+    db = get_db_session()
+    migrated = 0
+    try:
+        for user in db.query(User).filter(User.voice_embedding.isnot(None)):
+            blob = user.voice_embedding
+            target_code = DTYPE_CODES[dtype]
+            if not is_legacy(blob) and blob[5] == target_code:
+                continue
+            user.voice_embedding = encode_embedding(decode_embedding(blob), dtype=dtype)
+            # Same voice, new bytes: bump the version so caches re-read the blob
+            user.voice_embedding_version = (user.voice_embedding_version or 0) + 1
+            migrated += 1
+        db.commit()
+    finally:
+        db.close()
+    return migrated
+
+
+if __name__ == "__main__":
+    # python embedding_codec.py [float32|float16]
+    target = sys.argv[1] if len(sys.argv) > 1 else "float32"
+    count = migrate_embeddings(target)
+    print(f"✅ Migrated {count} voice embeddings to the compact {target} format.")
@@ -5,7 +5,6 @@ from sklearn.preprocessing import LabelEncoder
 from sklearn.linear_model import LogisticRegression
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, classification_report
-import pickle
 
 
 
@@ -46,14 +45,14 @@ print(encoder.inverse_transform(pred)[0])
 
 
 
+# Saved uncompressed with joblib so the serving workers can memory-map the arrays (model_artifacts.py)
+from model_artifacts import save_artifact
+
 #saving the vectorizer model
-with open('vectorizer.pkl', 'wb') as f:
-    pickle.dump(vectorizer, f)
+save_artifact(vectorizer, 'vectorizer.pkl')
 
 # #saving the lg model
-with open('intent_model.pkl', 'wb') as f:
-    pickle.dump(lg_model, f)
+save_artifact(lg_model, 'intent_model.pkl')
 
 #saving the encoder model
-with open('encoder.pkl', 'wb') as f:
-    pickle.dump(encoder, f)
\ No newline at end of file
+save_artifact(encoder, 'encoder.pkl')
\ No newline at end of file
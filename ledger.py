@@ -0,0 +1,274 @@
+# ledger.py
+# Money movement for make_payment: atomic conditional debits, idempotency keys, optional group commit.
+import asyncio
+import datetime
+import json
+import os
+import time
+from decimal import Decimal
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from database import Account, Transaction, IdempotencyKey, LedgerSessionLocal
+from money import to_decimal
+from account_cache import account_cache
+import spending
+
+# Group commit: concurrent payments share one transaction (and one fsync). If anything in a group
+# fails, the group is rolled back and its payments are retried one transaction each.
+GROUP_COMMIT = os.getenv("LEDGER_GROUP_COMMIT", "0") == "1"
+GROUP_MAX_BATCH = int(os.getenv("LEDGER_GROUP_MAX_BATCH", 64))
+GROUP_MAX_WAIT_MS = float(os.getenv("LEDGER_GROUP_MAX_WAIT_MS", 2))
+
+
+class PaymentResult:
+    """
+    status: "success" | "insufficient_funds" | "no_account"; amounts are Decimal rupees.
+    replayed=True when served from an idempotency key.
+    """
+    __slots__ = ("status", "amount", "balance", "transaction_id", "replayed")
+
+    def __init__(self, status, amount, balance=None, transaction_id=None, replayed=False):
+        self.status = status
+        self.amount = amount
+        self.balance = balance
+        self.transaction_id = transaction_id
+        self.replayed = replayed
+
+    def to_json(self):
+        # Amounts as strings: exact, unlike JSON numbers
+        return json.dumps({"status": self.status, "amount": str(self.amount),
+                           "balance": None if self.balance is None else str(self.balance),
+                           "transaction_id": self.transaction_id})
+
+    @classmethod
+    def from_json(cls, data):
+        values = json.loads(data)
+        for name in ("amount", "balance"):
+            if values[name] is not None:
+                values[name] = Decimal(str(values[name]))
+        return cls(replayed=True, **values)
+
+
+def _primary_account(user_id):
+    return (select(Account.id).where(Account.user_id == user_id)
+            .order_by(Account.id).limit(1).scalar_subquery())
+
+
+async def _stored_result(db, user_id, idempotency_key):
+    stored = await db.scalar(select(IdempotencyKey.response).where(
+        IdempotencyKey.user_id == user_id, IdempotencyKey.key == idempotency_key))
+    return PaymentResult.from_json(stored) if stored else None
+
+
+async def _debit(db, user_id, amount, description, idempotency_key, rollups=None):
+    """
+    One payment inside the caller's transaction, as Core statements (one round trip each):
+    1. UPDATE ... SET balance = balance - :amount WHERE balance >= :amount [RETURNING balance]
+       (check and debit in one statement: no read-modify-write race between concurrent payments)
+    2. INSERT the Transaction, and add it to the spending rollups (or to `rollups`, the deltas a
+       group writes in one statement before it commits)
+    3. INSERT the idempotency key with the result. Callers replay known keys before calling this;
+       a concurrent first attempt with the same key collides on its primary key and is rolled back
+       (see Ledger._debit_one)
+    Declined payments write nothing and leave no key, so a retry after a deposit can succeed.
+    """
+    account_id = _primary_account(user_id)
+    debit = (update(Account)
+             .where(Account.id == account_id, Account.balance >= amount)
+             .values(balance=Account.balance - amount)
+             .execution_options(synchronize_session=False))
+    if db.bind.dialect.update_returning:
+        balance = (await db.execute(debit.returning(Account.balance))).scalar()
+        debited = balance is not None
+    else:
+        debited = (await db.execute(debit)).rowcount == 1
+        balance = None
+    if not debited or balance is None:
+        # Same transaction, so this reads our own write and no one else's
+        balance = await db.scalar(select(Account.balance).where(Account.id == account_id))
+    if not debited:
+        return PaymentResult("no_account" if balance is None else "insufficient_funds", amount, balance)
+
+    today = datetime.date.today()
+    category = spending.categorize(description)
+    inserted = await db.execute(insert(Transaction).values(
+        user_id=user_id, transaction_date=today, description=description,
+        amount=amount, transaction_type="Debit", category=category))
+    if rollups is None:
+        await spending.record_debit(db, user_id, today, category, amount)
+    else:
+        spending.add_debit(rollups, user_id, today, category, amount)
+    result = PaymentResult("success", amount, balance, inserted.inserted_primary_key[0])
+    if idempotency_key:
+        await db.execute(insert(IdempotencyKey).values(
+            user_id=user_id, key=idempotency_key, created_at=datetime.datetime.now().isoformat(),
+            response=result.to_json()))
+    return result
+
+
+class _Pending:
+    __slots__ = ("args", "future")
+
+    def __init__(self, args, future):
+        self.args = args
+        self.future = future
+
+
+class Ledger:
+    def __init__(self, group_commit=GROUP_COMMIT, max_batch=GROUP_MAX_BATCH, max_wait_ms=GROUP_MAX_WAIT_MS):
+        self.group_commit = group_commit
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = None
+        self._writer = None
+        self._groups = 0
+        self._payments = 0
+        self._replays = 0
+        self._declined = 0
+        self._commit_ms = 0.0
+
+    async def debit(self, user_id, amount, description, idempotency_key=None):
+        """Debits the user's primary account by `amount` rupees (rounded to the paisa); returns a PaymentResult."""
+        amount = to_decimal(amount)
+        if amount <= 0:
+            raise ValueError(f"Invalid payment amount {amount!r}")
+        args = (user_id, amount, description, idempotency_key)
+        if self.group_commit:
+            result = await self._enqueue(args)
+        else:
+            result = await self._debit_one(args)
+        self._count(result)
+        if result.status == "success" and not result.replayed:
+            # After the commit: a snapshot loaded before it can no longer be stored (see account_cache.py)
+            account_cache.invalidate(user_id)
+        return result
+
+    async def _debit_one(self, args):
+        """One transaction per payment."""
+        user_id, _, _, idempotency_key = args
+        async with LedgerSessionLocal() as db:
+            try:
+                # A known key replays before the debit: a retry of a payment that has since drained
+                # the balance must still report the original success, not insufficient_funds
+                if idempotency_key:
+                    stored = await _stored_result(db, user_id, idempotency_key)
+                    if stored is not None:
+                        await db.commit()
+                        return stored
+                result = await _debit(db, *args)
+                await db.commit()
+                return result
+            except IntegrityError:
+                # Concurrent first attempts with the same key: undo this one's debit and replay the winner
+                await db.rollback()
+                stored = await _stored_result(db, user_id, idempotency_key)
+                await db.commit()
+                if stored is None:
+                    raise
+                return stored
+            except BaseException:
+                await db.rollback()
+                raise
+
+    async def _debit_group(self, group):
+        """
+        The whole group in one transaction. Known keys are looked up in one query up front and
+        duplicates inside the group replay the first one, so no statement is expected to fail;
+        if one does anyway (e.g. another process used the same key), everything is rolled back.
+        """
+        async with LedgerSessionLocal() as db:
+            try:
+                keys = {p.args[3] for p in group if p.args[3]}
+                replays = {}
+                if keys:
+                    rows = await db.execute(select(IdempotencyKey.user_id, IdempotencyKey.key, IdempotencyKey.response)
+                                            .where(IdempotencyKey.key.in_(keys)))
+                    replays = {(u, k): r for u, k, r in rows}
+                results = []
+                rollups = {}
+                for pending in group:
+                    user_id, _, _, key = pending.args
+                    if key and (user_id, key) in replays:
+                        results.append(PaymentResult.from_json(replays[(user_id, key)]))
+                        continue
+                    result = await _debit(db, *pending.args, rollups=rollups)
+                    if key and result.status == "success":
+                        replays[(user_id, key)] = result.to_json()
+                    results.append(result)
+                await spending.apply(db, rollups)
+                await db.commit()
+                return results
+            except BaseException:
+                await db.rollback()
+                raise
+
+    def _count(self, result):
+        self._payments += 1
+        if result.replayed:
+            self._replays += 1
+        elif result.status != "success":
+            self._declined += 1
+
+    async def _enqueue(self, args):
+        loop = asyncio.get_running_loop()
+        if self._writer is None or self._writer.done():
+            self._queue = asyncio.Queue()
+            self._writer = loop.create_task(self._write_loop())
+        future = loop.create_future()
+        await self._queue.put(_Pending(args, future))
+        return await future
+
+    async def _collect(self):
+        group = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(group) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                group.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return group
+
+    async def _write_loop(self):
+        # The only writer in group mode: payments are applied in arrival order, one commit per group
+        while True:
+            group = await self._collect()
+            start = time.perf_counter()
+            try:
+                results = await self._debit_group(group)
+            except Exception as e:
+                print(f"⚠️ Ledger group of {len(group)} rolled back ({e}); retrying one by one")
+                results = []
+                for pending in group:
+                    try:
+                        results.append(await self._debit_one(pending.args))
+                    except Exception as e:
+                        results.append(e)
+            self._groups += 1
+            self._commit_ms += (time.perf_counter() - start) * 1000
+            for pending, result in zip(group, results):
+                if pending.future.done():
+                    continue
+                if isinstance(result, Exception):
+                    pending.future.set_exception(result)
+                else:
+                    pending.future.set_result(result)
+
+    def stats(self):
+        return {
+            "group_commit": self.group_commit,
+            "payments": self._payments,
+            "replays": self._replays,
+            "declined": self._declined,
+            "groups": self._groups,
+            "avg_group_size": round(self._payments / self._groups, 2) if self._groups else None,
+            "avg_group_ms": round(self._commit_ms / self._groups, 2) if self._groups else None,
+        }
+
+
+# Singleton instance (LEDGER_GROUP_COMMIT=1 to batch concurrent payments into one commit)
+ledger = Ledger()
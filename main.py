@@ -1,24 +1,74 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, Header, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import JSONResponse, StreamingResponse
+from contextlib import asynccontextmanager
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-import shutil
+import asyncio
+import datetime
+import hmac
+import json
 import os
-import warnings
+import time
 
-import whisper 
-
-warnings.filterwarnings("ignore", message="FP16 is not supported on CPU; using FP32 instead")
+import numpy as np
 
 import database
 # UPDATED: Import Transaction model
-from database import User, Account, Loan, CreditCard, Transaction, get_db 
+from database import Loan, Transaction, get_async_db
 import ml_service
-from voice_security import voice_guard # Import our new security class
+import nlu_bundles
+import voice_pipeline # Whisper + voice security stages, run on bounded worker pools
+from worker_pool import PoolSaturated
+from audio_decoder import AudioDecodeError, AudioFrame
+from streaming import PCM16Stream, VADSegmenter
+from embedding_cache import embedding_cache
+from speaker_index import speaker_index
+from slot_rules import parse_amount, parse_date, parse_date_range
+import transactions
+import spending
+from account_cache import account_cache
+from translation import translator
+from ledger import ledger
+import response_templates
+from response_templates import render
+from model_registry import registry, names_from_env
+
+# Models load on first use. MODEL_WARMUP=nlu,whisper,voice_encoder (or "all") loads them in the
+# background at startup instead; /readyz waits for READY_MODELS (default: the warm-up list).
+WARMUP_MODELS = names_from_env("MODEL_WARMUP")
+READY_MODELS = names_from_env("READY_MODELS", os.getenv("MODEL_WARMUP", ""))
+# Poll models/nlu/CURRENT and hot-swap the NLU bundle when it changes (0 = only via /admin/nlu/reload)
+NLU_BUNDLE_WATCH_SECONDS = float(os.getenv("NLU_BUNDLE_WATCH_SECONDS", 0))
+# Admin endpoints are disabled unless ADMIN_TOKEN is set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Set by serve.py once the gunicorn master has run prepare_database(): forked workers skip it
+DATABASE_PREPARED = False
+
+def prepare_database():
+    """Schema, migrations, demo data and spending rollups: once per server start, not once per worker"""
+    database.init_db()
+    spending.backfill()
+    # A shared snapshot file may predate changes made while the server was down
+    account_cache.clear()
 
-database.init_db()
+@asynccontextmanager
+async def lifespan(app):
+    if not DATABASE_PREPARED:
+        prepare_database()
+    print(f"🔎 Speaker index loaded: {speaker_index.load_from_db()} enrolled voices")
+    if WARMUP_MODELS is None or WARMUP_MODELS:
+        registry.warm_up(WARMUP_MODELS)
+    registry.start_reaper()
+    if NLU_BUNDLE_WATCH_SECONDS:
+        ml_service.start_bundle_watcher(NLU_BUNDLE_WATCH_SECONDS)
+    yield
+    await database.async_engine.dispose()
+    await database.ledger_engine.dispose()
 
-app = FastAPI(title="Voice Banking API")
+app = FastAPI(title="Voice Banking API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -28,182 +78,572 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load Whisper model for STT
-print("⏳ Loading Whisper Model...")
-# NOTE: Ensure you have the 'base' whisper model installed or change to 'tiny' for speed
-whisper_model = whisper.load_model("base") 
-print("✅ Whisper Ready")
-
 class ChatRequest(BaseModel):
     message: str
     language: str = "en-US"
     user_id: str = "user" # Changed to String to match filenames
+    # Same key on a retried payment -> the original result, never a second debit
+    idempotency_key: str | None = None
+
+class ReloadRequest(BaseModel):
+    version: str | None = None  # None = the version named in CURRENT
+
+class BatchChatRequest(BaseModel):
+    messages: list[ChatRequest]
+    # Replays of recorded transcripts must not move money; payments are only previewed
+    execute_payments: bool = False
 
-def route_to_db(intent, slots, sub_intent, user_id, db: Session):
+# Intents answered from read-only lookups, which can be prefetched set-wise for many users
+READ_INTENTS = {"check_balance", "loan_inquiry", "credit_limit", "transaction_history"}
+# Transactions listed in a chat answer for a date range (the full range is at /transactions/export)
+CHAT_HISTORY_LIMIT = 5
+
+def add_date_slots(intent, slots, text):
+    """
+    Resolves "since January" / "last 3 days" ... into start_date/end_date for transaction_history
+    and spending_summary (which defaults to this month and also gets the category asked about)
+    """
+    if intent not in ("transaction_history", "spending_summary"): return slots
+    try:
+        date_range = parse_date_range(text)
+    except ValueError:
+        # "since 31 February": answered with invalid_date instead of guessing a range
+        slots["invalid_date"] = True
+        return slots
+    if intent == "spending_summary":
+        date_range = date_range or parse_date_range("this month")
+        category = spending.category_in(text)
+        if category: slots["category"] = category
+    if date_range:
+        slots["start_date"], slots["end_date"] = (d.isoformat() for d in date_range)
+    return slots
+
+def resolve_db_id(user_id):
     # Mapping "user" string to ID 1 for DB demo
-    db_id = 1 
-    user = db.query(User).filter(User.id == db_id).first()
-    
-    if intent == "check_balance":
-        acc = db.query(Account).filter(Account.user_id == db_id).first()
-        return f"Your balance is ₹{acc.balance:,.2f}." if acc else "No account."
+    return 1
 
-    # NEW: Money Transfer/Payment Logic
-    if intent == "make_payment":
-        try:
-            # Assumes ML service correctly extracted the 'amount' slot
-            amount_str = slots.get('amount')
-            
-            # Simple check for required slot
-            if not amount_str:
-                return "Please specify the amount you wish to transfer."
-            
-            # Clean and convert the slot value to float
-            # Note: This simple cleaning assumes the amount is the only thing in the slot
-            amount = float(amount_str.replace('₹', '').replace(',', '').strip())
-            
-            acc = db.query(Account).filter(Account.user_id == db_id).first()
-            if not acc: return "No account found to process payment."
-            
-            if acc.balance >= amount:
-                acc.balance -= amount # Debit the user's account
-                
-                # Log the transaction
-                db.add(Transaction(user_id=db_id, transaction_date="2025-11-23", 
-                                   description=f"Fund Transfer to {slots.get('recipient', 'External Account')}", 
-                                   amount=amount, transaction_type="Debit"))
-                
-                db.commit()
-                # In a real system, you would credit a recipient account here.
-                return f"Successfully transferred ₹{amount:,.2f}. Your new balance is ₹{acc.balance:,.2f}."
-            else:
-                return f"Insufficient balance. Your current balance is only ₹{acc.balance:,.2f}."
-                
-        except ValueError:
-            return "I could not understand the transfer amount. Please provide a valid number."
-        except Exception as e:
-            print(f"Payment error: {e}")
-            return "An unexpected error occurred while trying to process the payment."
+async def prefetch_user_data(db: AsyncSession, db_ids, intents):
+    """
+    Set-based lookups for read intents: one IN (...) query per table that the given
+    intents need, instead of one query per message. Returns {db_id: {...}}.
+    """
+    db_ids = list(set(db_ids))
+    data = {db_id: {"account": None, "loans": [], "card": None, "transactions": []} for db_id in db_ids}
+
+    if intents & {"check_balance", "credit_limit"}:
+        # Balance and card limits come from the account snapshot cache: no query when every user is cached
+        for db_id, snapshot in (await account_cache.snapshots(db, db_ids)).items():
+            data[db_id]["account"] = snapshot if snapshot.has_account else None
+            data[db_id]["card"] = snapshot if snapshot.has_card else None
+
+    if "loan_inquiry" in intents:
+        for loan in await db.scalars(select(Loan).where(Loan.user_id.in_(db_ids)).order_by(Loan.id)):
+            data[loan.user_id]["loans"].append(loan)
+
+    if "transaction_history" in intents:
+        # Last 3 transactions per user in one query (window function over the (user_id, date, id) index)
+        newest_first = (Transaction.transaction_date.desc(), Transaction.id.desc())
+        rank = func.row_number().over(partition_by=Transaction.user_id, order_by=newest_first).label("rank")
+        ranked = select(Transaction.id, rank).where(Transaction.user_id.in_(db_ids)).subquery()
+        recent = (select(Transaction).join(ranked, ranked.c.id == Transaction.id)
+                  .where(ranked.c.rank <= 3).order_by(*newest_first))
+        for t in await db.scalars(recent):
+            data[t.user_id]["transactions"].append(t)
+
+    return data
+
+def render_read_response(intent, sub_intent, user_data, language="en-US"):
+    """Builds the answer for a read intent from prefetched rows, in the requested language"""
+    if intent == "check_balance":
+        acc = user_data["account"]
+        if not acc: return render("check_balance", "no_account", language)
+        return render("check_balance", None, language, balance=acc.balance)
 
     if intent == "loan_inquiry":
         if sub_intent == "loan_status":
-            loans = db.query(Loan).filter(Loan.user_id == db_id).all()
-            if loans: return f"Your {loans[0].loan_type} status is: {loans[0].status}."
-            return "No active loans."
-        return "You are eligible for a Personal Loan."
+            loans = user_data["loans"]
+            if loans: return render("loan_inquiry", "loan_status", language, loan_type=loans[0].loan_type, status=loans[0].status)
+            return render("loan_inquiry", "no_loans", language)
+        return render("loan_inquiry", None, language)
 
     if intent == "credit_limit":
-        card = db.query(CreditCard).filter(CreditCard.user_id == db_id).first()
-        if not card: return "No credit card found."
-        if sub_intent == "credit_limit_used": return f"Used limit: ₹{card.limit_used:,.2f}"
-        return f"Available limit: ₹{card.limit_available:,.2f}"
+        card = user_data["card"]
+        if not card: return render("credit_limit", "no_card", language)
+        if sub_intent == "credit_limit_used": return render("credit_limit", "credit_limit_used", language, amount=card.limit_used)
+        return render("credit_limit", None, language, amount=card.limit_available)
 
     # NEW: Transaction History Logic
     if intent == "transaction_history":
-        # Fetch the last 3 transactions for the user
-        transactions = db.query(Transaction).filter(Transaction.user_id == db_id).order_by(Transaction.id.desc()).limit(3).all()
+        transactions = user_data["transactions"]
         
         if not transactions:
-            return "I couldn't find any recent transactions for your account."
+            return render("transaction_history", "empty", language)
             
-        summary = ["Your three most recent transactions are:"]
+        summary = [render("transaction_history", "header", language)]
         for t in transactions:
             # Format the output for natural conversation
-            summary.append(f"On {t.transaction_date}, a {t.transaction_type} of ₹{t.amount:,.2f} for {t.description}.")
+            summary.append(render("transaction_history", "line", language, date=t.transaction_date,
+                                  type=t.transaction_type, amount=t.amount, description=t.description))
             
         return "\n".join(summary)
 
+    return render("fallback", None, language)
+
+async def route_to_db(intent, slots, sub_intent, user_id, db: AsyncSession, language="en-US", idempotency_key=None):
+    db_id = resolve_db_id(user_id)
+
+    if slots.get("invalid_date"):
+        return render("invalid_date", None, language)
 
-    return "I processed your request but need more training on this specific topic."
+    if intent == "transaction_history" and slots.get("start_date"):
+        return await render_history_range(db, db_id, slots, language)
+
+    if intent == "spending_summary":
+        return await render_spending_summary(db, db_id, slots, language)
+
+    if intent in READ_INTENTS:
+        user_data = (await prefetch_user_data(db, [db_id], {intent}))[db_id]
+        return render_read_response(intent, sub_intent, user_data, language)
+
+    # NEW: Money Transfer/Payment Logic
+    if intent == "make_payment":
+        try:
+            # slot_rules already returns a normalized float; CRF-only spans are parsed here
+            amount_slot = slots.get('amount')
+            
+            # Simple check for required slot
+            if amount_slot is None:
+                return render("make_payment", "missing_amount", language)
+            
+            # Accepts "500 rupees", "₹1,200", "Rs. 250", plain numbers...
+            amount = parse_amount(amount_slot)
+            
+            # End this session's read transaction: the ledger writes on its own connection
+            await db.commit()
+
+            # Balance check, debit and transaction log happen atomically in the ledger (see ledger.py)
+            result = await ledger.debit(db_id, amount, f"Fund Transfer to {slots.get('recipient', 'External Account')}",
+                                        idempotency_key=idempotency_key)
+            if result.status == "no_account": return render("make_payment", "no_account", language)
+            if result.status == "insufficient_funds":
+                return render("make_payment", "insufficient_funds", language, balance=result.balance)
+            # In a real system, you would credit a recipient account here.
+            return render("make_payment", "success", language, amount=result.amount, balance=result.balance)
+                
+        except ValueError:
+            return render("make_payment", "invalid_amount", language)
+        except Exception as e:
+            print(f"Payment error: {e}")
+            return render("make_payment", "error", language)
+
+
+    return render("fallback", None, language)
+
+async def render_history_range(db: AsyncSession, db_id, slots, language="en-US"):
+    """Newest transactions within the slots' date range, one keyset page"""
+    start = parse_date(slots["start_date"])
+    end = parse_date(slots.get("end_date") or datetime.date.today().isoformat())
+    page, next_cursor = await transactions.fetch_page(db, db_id, start, end, limit=CHAT_HISTORY_LIMIT)
+    if not page:
+        return render("transaction_history", "range_empty", language, start=start, end=end)
+    summary = [render("transaction_history", "range_header", language, start=start, end=end)]
+    for t in page:
+        summary.append(render("transaction_history", "line", language, date=t.transaction_date,
+                              type=t.transaction_type, amount=t.amount, description=t.description))
+    if next_cursor:
+        summary.append(render("transaction_history", "more", language))
+    return "\n".join(summary)
+
+async def render_spending_summary(db: AsyncSession, db_id, slots, language="en-US"):
+    """Debit totals from the spending rollups: a few rows per month in range, not a scan of the history"""
+    start, end = parse_date(slots["start_date"]), parse_date(slots["end_date"])
+    category = slots.get("category")
+    total, count = await spending.spend_between(db, db_id, start, end, category)
+    if category:
+        return render("spending_summary", "category", language, amount=total, count=count,
+                      category=category, start=start, end=end)
+    return render("spending_summary", None, language, amount=total, count=count, start=start, end=end)
 
 @app.post("/chat")
-async def text_chat_endpoint(request: ChatRequest, db: Session = Depends(get_db)):
+async def text_chat_endpoint(request: ChatRequest, db: AsyncSession = Depends(get_async_db),
+                             idempotency_key: str | None = Header(None)):
     """Standard Text Chat (No Voice Security Check)"""
-    return process_request(request.message, request.language, request.user_id, db)
+    return await process_request(request.message, request.language, request.user_id, db,
+                                 idempotency_key=idempotency_key or request.idempotency_key)
+
+@app.post("/chat/batch")
+async def batch_chat_endpoint(request: BatchChatRequest, db: AsyncSession = Depends(get_async_db)):
+    """Bulk Text Chat for transcript replays (QA / analytics): vectorized NLU + set-based DB reads"""
+    results = await process_batch(request.messages, db, execute_payments=request.execute_payments)
+    return {"count": len(results), "results": results}
+
+async def _timed(awaitable):
+    """Awaits and returns (result, elapsed_ms)"""
+    start = time.perf_counter()
+    result = await awaitable
+    return result, round((time.perf_counter() - start) * 1000, 1)
+
+def _discard(task):
+    # Consume the outcome of a cancelled/abandoned task so asyncio does not warn about it
+    if not task.cancelled():
+        task.exception()
+
+def _date_param(value):
+    try:
+        return parse_date(value) if value else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/transactions")
+async def transactions_endpoint(
+    user_id: str = "user",
+    start_date: str | None = None,
+    end_date: str | None = None,
+    cursor: str | None = None,
+    limit: int = 50,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """One page of history, newest first; pass next_cursor back as cursor for the next page"""
+    try:
+        page, next_cursor = await transactions.fetch_page(
+            db, resolve_db_id(user_id), _date_param(start_date), _date_param(end_date), cursor, max(1, min(limit, 500)))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"transactions": [transactions.to_dict(t) for t in page], "next_cursor": next_cursor}
+
+@app.get("/transactions/export")
+async def transactions_export_endpoint(user_id: str = "user", start_date: str | None = None, end_date: str | None = None):
+    """Full history for a range as NDJSON (one transaction per line), streamed page by page"""
+    rows = transactions.export_ndjson(resolve_db_id(user_id), _date_param(start_date), _date_param(end_date))
+    return StreamingResponse(rows, media_type="application/x-ndjson")
 
 @app.post("/voice-chat")
 async def voice_chat_endpoint(
     audio: UploadFile = File(...),
-    language: str = Form("en-US"),
+    language: str = Form("auto"),
     user_id: str = Form("user"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    idempotency_key: str | None = Header(None)
 ):
-    """Voice Endpoint: Verifies Biometrics first, then processes intent"""
-    
-    # 1. Save temporary audio file
-    temp_filename = f"temp_{user_id}.webm"
-    with open(temp_filename, "wb") as buffer:
-        shutil.copyfileobj(audio.file, buffer)
+    """
+    Voice Endpoint: Verifies Biometrics first, then processes intent.
+    `language` is optional: with "auto" Whisper detects it and the answer comes back in the
+    spoken language; non-English speech reaches NLU through Whisper's own translate task.
+    """
+    io_pool, cpu_pool = voice_pipeline.io_pool, voice_pipeline.cpu_pool
+    speculative = voice_pipeline.SPECULATIVE_TRANSCRIBE
+    timings = {"mode": "speculative" if speculative else "sequential"}
+    request_start = time.perf_counter()
 
-    wav_file_path = "converted_input.wav"
     try:
-        # 2. VOICE SECURITY CHECK
+        # Shed load up front instead of queueing work we cannot finish in time
+        cpu_pool.check_capacity()
+
+        # 1. Decode the upload once into a shared AudioFrame (I/O pool)
+        try:
+            frame, timings["decode_ms"] = await _timed(io_pool.run(voice_pipeline.decode_upload, audio.file))
+        except AudioDecodeError as e:
+            return {"response": f"Security Alert: Voice verification failed. ({e})", "verified": False}
+
+        # 2. VOICE SECURITY CHECK (CPU pool)
+        # In speculative mode Whisper starts at the same time and is cancelled if this fails
         print(f"🔐 Verifying voice for {user_id}...")
-        is_verified, score, msg = voice_guard.verify_user(temp_filename, user_id)
+        hint = voice_pipeline.language_hint(language)
+        transcribe_task = None
+        if speculative:
+            transcribe_task = asyncio.create_task(_timed(voice_pipeline.speech_to_text(frame, hint)))
+        try:
+            (is_verified, score, msg), timings["verify_ms"] = await _timed(
+                cpu_pool.run(voice_pipeline.verify_speaker, frame, user_id))
+        except BaseException:
+            if transcribe_task:
+                transcribe_task.cancel()
+                transcribe_task.add_done_callback(_discard)
+            raise
         print(f"   ↳ Result: {msg} (Score: {score:.2f})")
 
         if not is_verified:
-            return {"response": f"Security Alert: Voice verification failed. (Score: {score:.2f})", "verified": False}
+            if transcribe_task:
+                transcribe_task.cancel()
+                transcribe_task.add_done_callback(_discard)
+                timings["transcribe_ms"] = "cancelled"
+            timings["total_ms"] = round((time.perf_counter() - request_start) * 1000, 1)
+            return {"response": f"Security Alert: Voice verification failed. (Score: {score:.2f})", "verified": False, "timings": timings}
 
-        
+        # 3. Speech to Text (Transcribe) using Whisper (CPU pool)
+        if transcribe_task:
+            speech, timings["transcribe_ms"] = await transcribe_task
+        else:
+            speech, timings["transcribe_ms"] = await _timed(voice_pipeline.speech_to_text(frame, hint))
+        transcribed_text = speech["text"]
+        print(f"🗣️ Transcribed ({speech['language']}): {transcribed_text}")
+        if speech["translation"]: print(f"   ↳ Translated: {speech['translation']}")
 
-        # 3. Speech to Text (Transcribe) using Whisper
-        result = whisper_model.transcribe(wav_file_path)
-        transcribed_text = result["text"]
-        print(f"🗣️ Transcribed: {transcribed_text}")
-
-        # 4. Process Intent
+        # 4. Process Intent (English text goes to NLU, the answer is rendered in the caller's language)
+        nlu_start = time.perf_counter()
         try:
-            response_data = process_request(transcribed_text, language, user_id, db)
+            response_data = await process_request(
+                transcribed_text, voice_pipeline.response_locale(language, speech["language"]), user_id, db,
+                english_text=speech["translation"] or transcribed_text, idempotency_key=idempotency_key)
         except Exception as e:
             print(f"⚠️ process_request error: {e}")
             response_data = {"response": "Failed to process your request.", "transcription": transcribed_text}
+        timings["nlu_ms"] = round((time.perf_counter() - nlu_start) * 1000, 1)
+        timings["total_ms"] = round((time.perf_counter() - request_start) * 1000, 1)
 
         return {
             "is_verified": bool(is_verified), # Cast it again just to be safe
             "transcription": response_data.get("transcription", transcribed_text),
-            "response": response_data["response"]
+            "translation": speech["translation"],
+            "detected_language": speech["language"],
+            "response": response_data["response"],
+            "timings": timings
         }
 
+    except PoolSaturated as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Voice service is busy. Please try again shortly.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+
+@app.post("/voice-identify")
+async def voice_identify_endpoint(audio: UploadFile = File(...)):
+    """Identifies the caller from voice alone (1:N against every enrolled user)"""
+    try:
+        voice_pipeline.cpu_pool.check_capacity()
+        try:
+            frame = await voice_pipeline.io_pool.run(voice_pipeline.decode_upload, audio.file)
+        except AudioDecodeError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        user_id, score, candidates = await voice_pipeline.cpu_pool.run(voice_pipeline.identify_speaker, frame)
+    except PoolSaturated as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Voice service is busy. Please try again shortly.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    return {
+        "identified": user_id is not None,
+        "user_id": user_id,
+        "score": score,
+        "candidates": [{"user_id": uid, "score": s} for uid, s in candidates],
+    }
+
+@app.websocket("/ws/voice-chat")
+async def voice_stream_endpoint(
+    websocket: WebSocket,
+    language: str = "auto",
+    user_id: str = "user"
+):
+    """
+    Streaming Voice Endpoint.
+    Client sends binary chunks of 16 kHz mono 16-bit PCM as they are captured (of any length), and may send
+    {"event": "end"} as text to force an endpoint. Server replies with JSON events:
+    - {"event": "partial", "text": ..., "language": ..., "translation": ...}
+                                         every time a speech segment is transcribed
+    - {"event": "final", ...}            after an endpoint: verification + NLU result
+    - {"event": "error", ...}            on overload or bad input
+    """
+    await websocket.accept()
+    pcm = PCM16Stream()
+    segmenter = VADSegmenter()
+    send_lock = asyncio.Lock()
+    segment_tasks = []   # transcription tasks of the current utterance, in order
+    segment_audio = []   # speech of the current utterance, for speaker verification
+    utterance_tasks = [] # utterances being verified / answered; frames keep being read meanwhile
+
+    async def send(payload):
+        async with send_lock:
+            await websocket.send_json(payload)
+
+    hint = voice_pipeline.language_hint(language)
+
+    async def transcribe_segment(frame):
+        speech = await voice_pipeline.speech_to_text(frame, hint)
+        await send({"event": "partial", **speech})
+        return speech
+
+    async def finish_utterance(tasks, audio, previous):
+        start = time.perf_counter()
+        try:
+            utterance = AudioFrame(np.concatenate(audio), source="stream")
+            # Verification overlaps with any segment transcription still in flight
+            is_verified, score, msg = await voice_pipeline.cpu_pool.run(voice_pipeline.verify_speaker, utterance, user_id)
+            segments = await asyncio.gather(*tasks)
+        except PoolSaturated as e:
+            await send({"event": "error", "detail": "Voice service is busy. Please try again shortly.",
+                        "retry_after": e.retry_after})
+            return
+        except Exception as e:
+            print(f"⚠️ Utterance error: {e}")
+            await send({"event": "error", "detail": "Failed to process your request."})
+            return
+        finally:
+            # If verification or one segment failed, the other segments are not needed any more
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                    task.add_done_callback(_discard)
+        if not is_verified:
+            payload = {"event": "final", "verified": False,
+                       "response": f"Security Alert: Voice verification failed. (Score: {score:.2f})"}
+        else:
+            transcribed_text = " ".join(s["text"] for s in segments if s["text"])
+            english_text = " ".join((s["translation"] or s["text"]) for s in segments if s["text"])
+            # The utterance's language is the one most of its segments were detected in
+            detected = [s["language"] for s in segments]
+            spoken = max(set(detected), key=detected.count)
+            try:
+                # A session per utterance: one held for the whole socket would keep a pooled
+                # connection idle in a transaction and serve stale rows from its identity map
+                async with database.AsyncSessionLocal() as db:
+                    response_data = await process_request(
+                        transcribed_text, voice_pipeline.response_locale(language, spoken), user_id, db,
+                        english_text=english_text)
+            except Exception as e:
+                print(f"⚠️ process_request error: {e}")
+                response_data = {"response": "Failed to process your request.", "transcription": transcribed_text}
+            payload = {
+                "event": "final",
+                "is_verified": True,
+                "transcription": response_data.get("transcription", transcribed_text),
+                "translation": english_text if english_text != transcribed_text else None,
+                "detected_language": spoken,
+                "response": response_data["response"],
+                "endpoint_to_response_ms": round((time.perf_counter() - start) * 1000, 1),
+            }
+        # Finals go out in utterance order, even when a short utterance is answered first
+        if previous is not None:
+            await asyncio.wait([previous])
+        await send(payload)
+
+    def handle(events):
+        nonlocal segment_tasks, segment_audio
+        for kind, frame in events:
+            if kind == "segment":
+                segment_audio.append(frame.samples)
+                segment_tasks.append(asyncio.create_task(transcribe_segment(frame)))
+            elif kind == "endpoint" and segment_tasks:
+                tasks, audio = segment_tasks, segment_audio
+                segment_tasks, segment_audio = [], []
+                previous = utterance_tasks[-1] if utterance_tasks else None
+                task = asyncio.create_task(finish_utterance(tasks, audio, previous))
+                task.add_done_callback(utterance_tasks.remove)
+                task.add_done_callback(_discard)
+                utterance_tasks.append(task)
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes"):
+                try:
+                    handle(segmenter.feed(pcm.feed(message["bytes"])))
+                except ValueError as e:
+                    # A bad frame costs the client that frame, not the connection
+                    await send({"event": "error", "detail": f"Malformed audio frame: {e}"})
+            elif message.get("text"):
+                try:
+                    event = json.loads(message["text"]).get("event")
+                except (ValueError, AttributeError):
+                    await send({"event": "error", "detail": "Expected JSON control message."})
+                    continue
+                if event == "end":
+                    handle(segmenter.flush())
+    except WebSocketDisconnect:
+        pass
     finally:
-        # 6. CRITICAL CLEANUP: Delete both the original WEBM and the converted WAV file
-        # Cleanup original WEBM file
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)
-        # Cleanup converted WAV file
-        if os.path.exists(wav_file_path):
-            os.remove(wav_file_path)
-
-def process_request(text, language, user_id, db):
+        for task in [*segment_tasks, *utterance_tasks]:
+            task.cancel()
+            task.add_done_callback(_discard)
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving (models may still be loading)"""
+    return {"status": "ok", "models": registry.stats()}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 503 until every model in READY_MODELS is resident"""
+    required = list(registry.models) if READY_MODELS is None else READY_MODELS
+    missing = registry.missing(required)
+    body = {"ready": not missing, "missing": missing, "models": registry.status()}
+    return JSONResponse(body, status_code=503 if missing else 200)
+
+def require_admin(x_admin_token: str = Header(None)):
+    if not ADMIN_TOKEN or not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required.")
+
+@app.get("/admin/nlu", dependencies=[Depends(require_admin)])
+async def nlu_bundle_status():
+    """Live NLU bundle version and the versions available on disk"""
+    return {"active": ml_service.active_version(), "current": nlu_bundles.current_version(),
+            "available": nlu_bundles.list_versions()}
+
+@app.post("/admin/nlu/reload", dependencies=[Depends(require_admin)])
+async def reload_nlu_bundle(request: ReloadRequest):
+    """Loads and validates a bundle in the background, then swaps it in; in-flight requests finish on the old one"""
+    try:
+        return await asyncio.to_thread(ml_service.reload_bundle, request.version)
+    except ml_service.ReloadInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ml_service.BundleValidationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@app.get("/metrics/pools")
+async def pool_metrics():
+    """Queue depth and wait-time metrics for the voice worker pools"""
+    return {
+        "voice_io": voice_pipeline.io_pool.stats(),
+        "voice_cpu": voice_pipeline.cpu_pool.stats(),
+        "whisper_batcher": voice_pipeline.batcher.stats() if voice_pipeline.batcher else None,
+        "embedding_cache": embedding_cache.stats(),
+        "speaker_index": speaker_index.stats(),
+        "translation": translator.stats(),
+        "models": registry.stats(),
+        "db_pool": database.pool_stats(),
+        "ledger": ledger.stats(),
+        "account_cache": account_cache.stats(),
+    }
+
+async def process_request(text, language, user_id, db, english_text=None, idempotency_key=None):
     # Logic shared between text and voice
-    
+    # english_text: the voice path already has an English version from Whisper's translate task
+
     # Translation (Hindi -> En)
-    if language == 'hi-IN':
-        try:
-            translation = ml_service.ml_engine.translator.translate(text, src='hi', dest='en')
-            text = translation.text
-        except: pass
+    # (cached, deadline-bound, falls back to the original text; see translation.py)
+    if english_text is None:
+        english_text = text
+        if language == 'hi-IN':
+            english_text = text = await translator.translate(text, src='hi', dest='en')
 
     # ML
-    intent = ml_service.ml_engine.predict_intent(text)
+    engine = ml_service.get_engine()
+    intent = engine.predict_intent(english_text)
     print(intent)
     # The slots dictionary is critical for extracting the amount and recipient for the transfer
-    slots = ml_service.ml_engine.predict_slots(text) 
+    slots = add_date_slots(intent, engine.predict_slots(english_text), english_text)
     print(slots)
     
     sub_intent = None
-    if intent == "loan_inquiry": sub_intent = ml_service.ml_engine.predict_sub_intent(text)
-    elif intent == "credit_limit": sub_intent = ml_service.ml_engine.predict_credit_sub_intent(text)
+    if intent == "loan_inquiry": sub_intent = engine.predict_sub_intent(english_text)
+    elif intent == "credit_limit": sub_intent = engine.predict_credit_sub_intent(english_text)
 
-    # DB
-    response_text = route_to_db(intent, slots, sub_intent, user_id, db)
+    # DB: answers come from the template catalog, already in the user's language when it
+    # has stored translations for it; only other languages still go through the translator
+    localized = response_templates.supports(language)
+    response_text = await route_to_db(intent, slots, sub_intent, user_id, db, language if localized else "en-US",
+                                      idempotency_key=idempotency_key)
 
-    # Translation (En -> Hindi)
-    if language == 'hi-IN':
-        try:
-            translation = ml_service.ml_engine.translator.translate(response_text, src='en', dest='hi')
-            response_text = translation.text
-        except: pass
+    # Translation (En -> caller's language), only when the catalog has no stored translation
+    target = response_templates.base_language(language)
+    if target != 'en' and not localized:
+        response_text = await translator.translate(response_text, src='en', dest=target)
         
     return {
         "response": response_text,
@@ -212,6 +652,60 @@ def process_request(text, language, user_id, db):
         "slots": slots # Added slots to the response
     }
 
+async def process_batch(messages, db, execute_payments=False):
+    """Batch version of process_request: every stage runs once over the whole list"""
+    engine = ml_service.get_engine()
+    texts = [m.message for m in messages]
+
+    # Group by language: only the Hindi group needs the translation hop (Hindi -> En)
+    hindi = [i for i, m in enumerate(messages) if m.language == 'hi-IN']
+    if hindi:
+        translated = await translator.translate_many([texts[i] for i in hindi], 'hi', 'en')
+        for i in hindi: texts[i] = translated[texts[i]]
+
+    # ML, vectorized over the batch
+    intents = engine.predict_intents(texts)
+    all_slots = [add_date_slots(intent, slots, text)
+                 for intent, slots, text in zip(intents, engine.predict_slots_batch(texts), texts)]
+    sub_intents = []
+    for text, intent in zip(texts, intents):
+        if intent == "loan_inquiry": sub_intents.append(engine.predict_sub_intent(text))
+        elif intent == "credit_limit": sub_intents.append(engine.predict_credit_sub_intent(text))
+        else: sub_intents.append(None)
+
+    # DB: one set-based lookup per table for all read intents
+    db_ids = [resolve_db_id(m.user_id) for m in messages]
+    # (date-range history questions are answered one by one below)
+    bulk = [intent in READ_INTENTS and not all_slots[i].get("start_date") and not all_slots[i].get("invalid_date")
+            for i, intent in enumerate(intents)]
+    reads = [i for i, is_bulk in enumerate(bulk) if is_bulk]
+    prefetched = await prefetch_user_data(db, [db_ids[i] for i in reads], {intents[i] for i in reads}) if reads else {}
+
+    # Responses are rendered from the catalog in each message's language where possible
+    languages = [m.language if response_templates.supports(m.language) else "en-US" for m in messages]
+    responses = []
+    for i, (intent, slots, sub_intent) in enumerate(zip(intents, all_slots, sub_intents)):
+        if bulk[i]:
+            responses.append(render_read_response(intent, sub_intent, prefetched[db_ids[i]], languages[i]))
+        elif intent == "make_payment" and not execute_payments:
+            responses.append(render("make_payment", "preview", languages[i],
+                                    amount=slots.get('amount', '?'), recipient=slots.get('recipient', 'External Account')))
+        else:
+            # Writes stay one at a time
+            responses.append(await route_to_db(intent, slots, sub_intent, messages[i].user_id, db, languages[i],
+                                               idempotency_key=messages[i].idempotency_key))
+
+    # Translation (En -> Hindi), only for messages the catalog could not localize
+    hindi = [i for i in hindi if languages[i] == "en-US"]
+    if hindi:
+        translated = await translator.translate_many([responses[i] for i in hindi], 'en', 'hi')
+        for i in hindi: responses[i] = translated[responses[i]]
+
+    return [
+        {"response": response, "transcription": text, "intent": intent, "slots": slots}
+        for response, text, intent, slots in zip(responses, texts, intents, all_slots)
+    ]
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,56 +1,131 @@
-import joblib
 import pickle
-import numpy as np
-from token_feature import sent2features
-from googletrans import Translator
+from token_feature import tokens2crfsuite
 import os
+import re
+import threading
+import time
+from cache import LRUCache
+from slot_rules import extract_rule_slots
+from model_registry import registry
+from model_artifacts import load_artifact
+import nlu_bundles
 
+# Production traffic is very repetitive ("check my balance"), so predictions are memoized
+NLU_CACHE_SIZE = int(os.getenv("NLU_CACHE_SIZE", 4096))
+
+# The intent model's labels -> the intent names route_to_db handles
+INTENT_ALIASES = {
+    "transfer": "make_payment",
+    "check_credit_limit": "credit_limit",
+}
+
+# Spending questions are answered from the rollups (spending.py). Bundles trained before the
+# spending_summary intent existed do not know it, so for those bundles (only) these phrasings are
+# routed by rule; bundles trained with it are left to the model.
+SPENDING_QUERY = re.compile(
+    r"\bhow much (?:did|have|do) i (?:spend|spent|pay|paid)\b"
+    r"|\b(?:total|sum) (?:of )?(?:my )?(?:debits|expenses|spending)\b(?! limit)"
+    r"|\bspending (?:summary|breakdown)\b|\bmy spending (?:this|last|in|on|since|for)\b", re.IGNORECASE)
+
+# Checked against every new bundle before it is swapped in (bundles can ship their own smoke.jsonl)
+DEFAULT_SMOKE_SET = [
+    ("check my account balance", "check_balance"),
+    ("transfer 500 rupees to Rahul", "make_payment"),
+    ("what is my credit limit", "credit_limit"),
+    ("show my recent transactions", "transaction_history"),
+    ("what is the status of my loan", "loan_inquiry"),
+    ("how much did I spend this month", "spending_summary"),
+]
+SMOKE_MIN_ACCURACY = float(os.getenv("NLU_SMOKE_MIN_ACCURACY", 0.8))
+
+_WS = re.compile(r"\s+")
+
+def normalize_text(text):
+    """Cache key for intents: TF-IDF lowercases and ignores spacing, so these collapse to one entry."""
+    return _WS.sub(" ", text.strip().lower())
 
 
 
 
 class MLEngine:
-    def __init__(self):
-        print("⏳ Loading ML Models...")
+    def __init__(self, bundle_dir=".", version=nlu_bundles.LEGACY_VERSION):
+        print(f"⏳ Loading ML Models (bundle {version})...")
+        self.version = version
+        self.bundle_dir = bundle_dir
         self.intent_model = None
         self.tfidf = None
         self.crf = None
-        self.translator = Translator()
+        self.intent_cache = LRUCache(NLU_CACHE_SIZE)
+        # Slot features are case-sensitive (istitle/isupper), so slots are keyed on the tokens only
+        self.slot_cache = LRUCache(NLU_CACHE_SIZE)
         
         # Load Intent Model
-        if os.path.exists("intent_model.pkl") and os.path.exists("vectorizer.pkl") and os.path.exists('encoder.pkl'):
-            self.intent_model = joblib.load("intent_model.pkl")
-            self.tfidf = joblib.load("vectorizer.pkl")
-            self.encoder = joblib.load('encoder.pkl')
+        intent_paths = [os.path.join(bundle_dir, name)
+                        for name in ("intent_model.pkl", "vectorizer.pkl", "encoder.pkl")]
+        if all(os.path.exists(p) for p in intent_paths):
+            # Memory-mapped when saved by model_artifacts (shared read-only pages across workers)
+            self.intent_model, self.tfidf, self.encoder = (load_artifact(p) for p in intent_paths)
+        self.spending_rule = self.intent_model is None or "spending_summary" not in list(self.encoder.classes_)
         # Load Slot Filling Model
-        if os.path.exists("slot_filling_crf_model.pkl"):
-            with open("slot_filling_crf_model.pkl", "rb") as f:
+        crf_path = os.path.join(bundle_dir, "slot_filling_crf_model.pkl")
+        if os.path.exists(crf_path):
+            with open(crf_path, "rb") as f:
                 self.crf = pickle.load(f)
 
         print("✅ Models loading sequence complete.")
 
     def predict_intent(self, text):
-        if not self.intent_model: return "general_query"
-        vect = self.tfidf.transform([text])
-        pred = self.intent_model.predict(vect)
-        return self.encoder.inverse_transform(pred)[0]
-        
+        return self.predict_intents([text])[0]
+
+    def predict_intents(self, texts):
+        """Batch intent prediction: one TF-IDF transform and one predict call for all cache misses."""
+        keys = [normalize_text(t) for t in texts]
+        results = [self.intent_cache.get(k) for k in keys]
+        misses = sorted({k for k, r in zip(keys, results) if r is None})
+        if misses:
+            predicted = {k: "spending_summary" for k in misses if self.spending_rule and SPENDING_QUERY.search(k)}
+            misses = [k for k in misses if k not in predicted]
+            if misses and self.intent_model:
+                vect = self.tfidf.transform(misses)
+                preds = self.encoder.inverse_transform(self.intent_model.predict(vect))
+                predicted.update((k, INTENT_ALIASES.get(str(p), str(p))) for k, p in zip(misses, preds))
+            for k, intent in predicted.items():
+                self.intent_cache.put(k, intent)
+            results = [r if r is not None else predicted.get(k, "general_query") for k, r in zip(keys, results)]
+        return results
+
     def predict_slots(self, text):
-        if not self.crf: return {}
-        
-        tokens = text.split()
-        
-        # FIX: Generate REAL POS tags using NLTK
-        # The feature.py expects tuple (word, postag)
-        
-        
-        features = sent2features([(t, 'O') for t in tokens])
-        
-        try:
-            pred = self.crf.predict([features])[0]
-        except IndexError:
-            return {}
-        
+        return self.predict_slots_batch([text])[0]
+
+    def predict_slots_batch(self, texts):
+        """
+        Batch slot filling for every uncached sentence:
+        1. slot_rules pulls out typed amounts / account numbers with compiled patterns
+        2. only the leftover tokens are featurized and tagged by the CRF
+        """
+        keys = [" ".join(text.split()) for text in texts]
+        results = [self.slot_cache.get(k) for k in keys]
+
+        todo = {k: extract_rule_slots(k) for k, r in zip(keys, results) if r is None and k}
+        if todo:
+            crf_slots = {}
+            pending = [(k, rest) for k, (_, rest) in todo.items() if rest]
+            if self.crf and pending:
+                # Compact attribute lists straight to the crfsuite tagger (same tags as sent2features dicts,
+                # see bench_features.py)
+                tagger = self.crf.tagger_
+                for k, tokens in pending:
+                    crf_slots[k] = self._extract_slots(tokens, tagger.tag(tokens2crfsuite(tokens)))
+            for k, (rule_slots, _) in todo.items():
+                slots = crf_slots.get(k, {})
+                slots.update(rule_slots)  # Typed rule values win over CRF spans
+                todo[k] = slots
+                self.slot_cache.put(k, slots)
+
+        # Copies, so callers can edit their slots without touching the cache
+        return [dict(r if r is not None else todo.get(k, {})) for k, r in zip(keys, results)]
+
+    def _extract_slots(self, tokens, pred):
         # Extract slots
         slots = {}
         current_slot = None
@@ -84,8 +159,92 @@ class MLEngine:
         if "used" in text or "due" in text: return "credit_limit_used"
         return "general_credit_query"
 
-ml_engine = MLEngine()
+def load_engine(version=None):
+    """MLEngine for `version` (default: the bundle named in CURRENT, else the working directory)."""
+    version, path = nlu_bundles.resolve(version)
+    return MLEngine(path, version)
+
+
+# Singleton instance, built on first use (get_engine()). A request should call get_engine() once
+# and use that engine throughout, so a hot reload never mixes two bundles within one request.
+nlu_model = registry.register("nlu", load_engine)
+
+
+def get_engine():
+    return nlu_model.get()
+
+
+class BundleValidationError(Exception):
+    pass
+
+
+class ReloadInProgress(Exception):
+    pass
+
+
+def validate_engine(engine, smoke_set):
+    """Runs the smoke set through the engine (which also warms it); returns (accuracy, failures)."""
+    if not engine.intent_model:
+        return 0.0, [{"error": "intent model artifacts missing"}]
+    texts = [text for text, _ in smoke_set]
+    predicted = engine.predict_intents(texts)
+    engine.predict_slots_batch(texts)
+    failures = [{"text": t, "expected": e, "predicted": p}
+                for (t, e), p in zip(smoke_set, predicted) if p != e]
+    return 1 - len(failures) / len(smoke_set), failures
+
+
+_reload_lock = threading.Lock()
+
+
+def reload_bundle(version=None):
+    """
+    Loads a bundle next to the live one, validates it on its smoke set and swaps it in.
+    Requests already holding the old engine finish on it; new requests get the new one.
+    An explicit `version` also becomes CURRENT, so other workers' watchers follow.
+    """
+    if not _reload_lock.acquire(blocking=False):
+        raise ReloadInProgress("An NLU reload is already running.")
+    try:
+        start = time.perf_counter()
+        engine = load_engine(version)
+        smoke_set = nlu_bundles.load_smoke_set(engine.bundle_dir) or DEFAULT_SMOKE_SET
+        accuracy, failures = validate_engine(engine, smoke_set)
+        if accuracy < SMOKE_MIN_ACCURACY:
+            raise BundleValidationError(
+                f"Bundle {engine.version} scored {accuracy:.0%} on the smoke set "
+                f"(minimum {SMOKE_MIN_ACCURACY:.0%}): {failures}")
+        previous = nlu_model.swap(engine)
+        if version:
+            nlu_bundles.set_current(engine.version)
+        print(f"🔁 NLU bundle {getattr(previous, 'version', None)} -> {engine.version}")
+        return {"version": engine.version, "previous": getattr(previous, "version", None),
+                "smoke_accuracy": accuracy, "reload_ms": round((time.perf_counter() - start) * 1000, 1)}
+    finally:
+        _reload_lock.release()
+
+
+def active_version():
+    engine = nlu_model._model
+    return engine.version if engine is not None else None
+
+
+def start_bundle_watcher(interval):
+    """Polls CURRENT and reloads when it names a different version than the live engine."""
+    rejected = set()  # versions that failed validation are not retried every tick
 
-text = 'What is my credit limit?'
+    def watch():
+        while True:
+            time.sleep(interval)
+            wanted = nlu_bundles.current_version()
+            if not wanted or wanted in rejected or not nlu_model.loaded or wanted == active_version():
+                continue
+            try:
+                reload_bundle()
+            except ReloadInProgress:
+                pass
+            except Exception as e:
+                print(f"⚠️ NLU bundle {wanted} rejected: {e}")
+                rejected.add(wanted)
 
-print(ml_engine.predict_intent(text))
\ No newline at end of file
+    threading.Thread(target=watch, name="nlu-bundle-watcher", daemon=True).start()
@@ -0,0 +1,43 @@
+# model_artifacts.py
+# NLU artifacts in a memory-mappable layout: uncompressed joblib files keep every numpy array
+# (TF-IDF idf_, LogisticRegression coef_/intercept_, encoder classes_) as a raw buffer, which
+# joblib.load(..., mmap_mode="r") maps from the page cache instead of copying into each worker.
+import os
+import sys
+
+import joblib
+
+INTENT_ARTIFACTS = ("intent_model.pkl", "vectorizer.pkl", "encoder.pkl")
+
+# NLU_MMAP_MODE="" loads the arrays into private memory as before
+MMAP_MODE = os.getenv("NLU_MMAP_MODE", "r") or None
+
+
+def load_artifact(path):
+    # Plain pickles written by older training scripts still load; they just are not mapped
+    return joblib.load(path, mmap_mode=MMAP_MODE)
+
+
+def save_artifact(obj, path):
+    # compress=0 (the default) is what makes the arrays mappable
+    joblib.dump(obj, path)
+
+
+def convert(paths=INTENT_ARTIFACTS):
+    """Rewrites pickle.dump artifacts as uncompressed joblib files, in place."""
+    converted = 0
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        obj = joblib.load(path)
+        tmp = path + ".tmp"
+        save_artifact(obj, tmp)
+        os.replace(tmp, path)
+        converted += 1
+    return converted
+
+
+if __name__ == "__main__":
+    # python model_artifacts.py [artifact.pkl ...]
+    count = convert(sys.argv[1:] or INTENT_ARTIFACTS)
+    print(f"✅ Rewrote {count} NLU artifacts in the memory-mappable joblib format.")
@@ -0,0 +1,261 @@
+# model_registry.py
+# Models are loaded on first use instead of at import time, optionally warmed up in the background.
+# The registry also keeps the resident models within a memory budget: the least recently used
+# unpinned models are evicted when a load would exceed it, or after sitting idle too long.
+import gc
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+
+def estimate_size(obj, _depth=0, _seen=None):
+    """
+    Approximate resident bytes of a model object: torch parameters/buffers, numpy arrays,
+    and containers/attributes a few levels down. Memory-mapped arrays are not counted
+    (their pages belong to the page cache and are shared between workers).
+    """
+    seen = _seen if _seen is not None else set()
+    if id(obj) in seen or _depth > 6:
+        return 0
+    seen.add(id(obj))
+
+    torch = sys.modules.get("torch")
+    if torch is not None and isinstance(obj, torch.nn.Module):
+        tensors = list(obj.parameters()) + list(obj.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    if isinstance(obj, np.memmap):
+        return 0
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (bytes, bytearray, str)):
+        return sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(
+            estimate_size(k, _depth + 1, seen) + estimate_size(v, _depth + 1, seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return sys.getsizeof(obj) + sum(estimate_size(v, _depth + 1, seen) for v in obj)
+    if hasattr(obj, "__dict__"):
+        return sys.getsizeof(obj) + estimate_size(vars(obj), _depth + 1, seen)
+    return sys.getsizeof(obj)
+
+
+class LazyModel:
+    """
+    Holds a loader and builds the model the first time get() is called, and again after an eviction.
+    Loads are single-flight: concurrent callers wait on the one load in progress instead of each
+    loading their own copy. Callers keep the object get() returned for the duration of their call,
+    so evicting a model never pulls it out from under a running request.
+    """
+    def __init__(self, name, loader, registry=None, pinned=False, size_fn=None):
+        self.name = name
+        self.loader = loader
+        self.registry = registry
+        self.pinned = pinned          # never evicted
+        self.size_fn = size_fn or estimate_size
+        self._model = None
+        self._lock = threading.Lock()
+        self.loading = False
+        self.load_ms = None
+        self.loaded_at = None
+        self.last_used = 0.0
+        self.size_bytes = 0
+        self.loads = 0
+        self.evictions = 0
+        self.error = None
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    @property
+    def ready(self):
+        """Loaded successfully at least once (an evicted model is reloaded on demand)."""
+        return self.loaded_at is not None and self.error is None
+
+    def get(self):
+        model = self._model
+        if model is not None:
+            self.last_used = time.monotonic()
+            return model
+        with self._lock:
+            if self._model is None:
+                self.loading = True
+                print(f"⏳ Loading {self.name}...")
+                start = time.perf_counter()
+                try:
+                    self._model = self.loader()
+                except Exception as e:
+                    self.error = str(e)
+                    raise
+                finally:
+                    self.loading = False
+                self.error = None
+                self.load_ms = round((time.perf_counter() - start) * 1000, 1)
+                self.loaded_at = time.time()
+                self.size_bytes = self.size_fn(self._model)
+                self.loads += 1
+                print(f"✅ {self.name} ready ({self.load_ms} ms, ~{self.size_bytes / 2**20:.1f} MB)")
+            model = self._model
+            self.last_used = time.monotonic()
+        if self.registry:
+            self.registry.enforce_budget(keep=self)
+        return model
+
+    def swap(self, model):
+        """Replaces the resident model atomically (hot reload); returns the previous one, or None."""
+        with self._lock:
+            previous = self._model
+            self._model = model
+            self.error = None
+            self.loaded_at = time.time()
+            self.size_bytes = self.size_fn(model)
+            self.loads += 1
+            self.last_used = time.monotonic()
+        if self.registry:
+            self.registry.enforce_budget(keep=self)
+        return previous
+
+    def unload(self):
+        """Drops the resident copy; skipped (False) while a load of this model is in progress."""
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            if self._model is None:
+                return False
+            self._model = None
+            self.evictions += 1
+        finally:
+            self._lock.release()
+        return True
+
+    def idle_seconds(self):
+        return time.monotonic() - self.last_used if self.loaded else None
+
+    def status(self):
+        idle = self.idle_seconds()
+        return {"loaded": self.loaded, "loading": self.loading, "load_ms": self.load_ms, "error": self.error,
+                "size_mb": round(self.size_bytes / 2**20, 1), "pinned": self.pinned,
+                "idle_s": round(idle, 1) if idle is not None else None,
+                "loads": self.loads, "evictions": self.evictions}
+
+
+class ModelRegistry:
+    """
+    - budget_bytes: after every load, least recently used unpinned models are evicted until the
+      resident total fits (0 = no budget). A model bigger than the whole budget still loads.
+    - idle_seconds: the reaper thread evicts unpinned models unused for this long (0 = never).
+    """
+    def __init__(self, budget_bytes=0, idle_seconds=0, pinned=()):
+        self.models = {}
+        self.budget_bytes = budget_bytes
+        self.idle_seconds = idle_seconds
+        self.pinned = None if pinned is None else set(pinned)  # None = every model
+        self._evict_lock = threading.Lock()
+        self._reaper_pid = None
+
+    def register(self, name, loader, size_fn=None):
+        pinned = self.pinned is None or name in self.pinned
+        model = LazyModel(name, loader, registry=self, pinned=pinned, size_fn=size_fn)
+        self.models[name] = model
+        return model
+
+    def resident_bytes(self):
+        return sum(m.size_bytes for m in self.models.values() if m.loaded)
+
+    def _evict(self, models, reason):
+        evicted = [m.name for m in models if m.unload()]
+        if evicted:
+            gc.collect()
+            print(f"♻️ Evicted {', '.join(evicted)} ({reason}); resident ~{self.resident_bytes() / 2**20:.1f} MB")
+        return evicted
+
+    def enforce_budget(self, keep=None):
+        if not self.budget_bytes or self.resident_bytes() <= self.budget_bytes:
+            return []
+        with self._evict_lock:
+            candidates = sorted(
+                (m for m in self.models.values() if m.loaded and not m.pinned and m is not keep),
+                key=lambda m: m.last_used)
+            victims = []
+            resident = self.resident_bytes()
+            for model in candidates:
+                if resident <= self.budget_bytes:
+                    break
+                victims.append(model)
+                resident -= model.size_bytes
+            return self._evict(victims, "memory budget")
+
+    def evict_idle(self):
+        if not self.idle_seconds:
+            return []
+        with self._evict_lock:
+            idle = [m for m in self.models.values()
+                    if m.loaded and not m.pinned and (m.idle_seconds() or 0) >= self.idle_seconds]
+            return self._evict(idle, f"idle > {self.idle_seconds:g} s")
+
+    def start_reaper(self):
+        """Starts the idle-eviction thread in this process (once per process; no-op without idle_seconds)."""
+        if not self.idle_seconds or self._reaper_pid == os.getpid():
+            return
+        self._reaper_pid = os.getpid()
+        interval = min(max(self.idle_seconds / 2, 1), 60)
+
+        def reap():
+            while True:
+                time.sleep(interval)
+                self.evict_idle()
+
+        threading.Thread(target=reap, name="model-reaper", daemon=True).start()
+
+    def warm_up(self, names=None, background=True):
+        """Loads the given models (all registered ones by default), on a daemon thread unless background=False."""
+        names = list(self.models) if names is None else [n for n in names if n in self.models]
+
+        def load_all():
+            for name in names:
+                try:
+                    self.models[name].get()
+                except Exception as e:
+                    print(f"⚠️ Warm-up of {name} failed: {e}")
+
+        if not background:
+            load_all()
+            return None
+        thread = threading.Thread(target=load_all, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def missing(self, names):
+        """Names from `names` that have not been loaded successfully yet."""
+        return [n for n in names if n not in self.models or not self.models[n].ready]
+
+    def status(self):
+        return {name: model.status() for name, model in self.models.items()}
+
+    def stats(self):
+        return {"budget_mb": round(self.budget_bytes / 2**20, 1) if self.budget_bytes else None,
+                "resident_mb": round(self.resident_bytes() / 2**20, 1),
+                "idle_seconds": self.idle_seconds or None,
+                "models": self.status()}
+
+
+def names_from_env(var, default=""):
+    """MODEL_WARMUP=nlu,whisper -> ["nlu", "whisper"]; "all" -> None (every registered model)."""
+    value = os.getenv(var, default).strip()
+    if value == "all":
+        return None
+    return [n.strip() for n in value.split(",") if n.strip()]
+
+
+# Singleton instance
+# MODEL_MEMORY_BUDGET_MB: cap on resident model memory (0 = unlimited)
+# MODEL_IDLE_SECONDS: evict models unused for this long (0 = keep forever)
+# MODEL_PINNED: models that are never evicted (default: the small NLU bundle)
+registry = ModelRegistry(
+    budget_bytes=int(float(os.getenv("MODEL_MEMORY_BUDGET_MB", 0)) * 2**20),
+    idle_seconds=float(os.getenv("MODEL_IDLE_SECONDS", 0)),
+    pinned=names_from_env("MODEL_PINNED", "nlu"),
+)
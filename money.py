@@ -0,0 +1,48 @@
+# money.py
+# Amounts are stored as integer minor units (paise) and handled as Decimal rupees in Python.
+# Floats cannot represent most paise values exactly, so sums and balance updates drifted.
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from sqlalchemy import BigInteger
+from sqlalchemy.types import TypeDecorator
+
+MINOR_PER_UNIT = 100
+_PAISA = Decimal("0.01")
+
+
+def to_decimal(amount):
+    """Rupees as a Decimal rounded to the paisa; accepts int, float, Decimal or numeric strings."""
+    try:
+        value = Decimal(str(amount)).quantize(_PAISA, rounding=ROUND_HALF_UP)
+    except (InvalidOperation, ValueError) as e:
+        raise ValueError(f"Invalid amount {amount!r}") from e
+    if not value.is_finite():
+        raise ValueError(f"Invalid amount {amount!r}")
+    return value
+
+
+def to_minor(amount):
+    """Rupees -> integer paise (₹12.34 -> 1234)."""
+    return int(to_decimal(amount) * MINOR_PER_UNIT)
+
+
+def from_minor(minor):
+    """Integer paise -> Decimal rupees (1234 -> Decimal("12.34"))."""
+    return (Decimal(int(minor)) / MINOR_PER_UNIT).quantize(_PAISA)
+
+
+class Money(TypeDecorator):
+    """
+    Column type for amounts: BIGINT paise in the database, Decimal rupees in Python.
+    Literals compared with or added to a Money column are converted too, so
+    `Account.balance - amount` is integer arithmetic in SQL.
+    """
+    impl = BigInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else to_minor(value)
+
+    def process_result_value(self, value, dialect):
+        # round(): SQLite columns created as FLOAT hand the integers back as REAL
+        return None if value is None else from_minor(round(value))
@@ -0,0 +1,129 @@
+# nlu_bundles.py
+# Versioned NLU model bundles on disk:
+#
+#   models/nlu/
+#     CURRENT                 name of the active version (one line)
+#     2026-10-18/             one directory per version
+#       intent_model.pkl  vectorizer.pkl  encoder.pkl  slot_filling_crf_model.pkl
+#       smoke.jsonl           optional {"text": ..., "intent": ...} lines checked before activation
+#       manifest.json         sha256 of every artifact, written by publish()
+#
+# Without a bundle directory the artifacts are read from the working directory as before ("legacy").
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+BUNDLE_DIR = os.getenv("NLU_BUNDLE_DIR", os.path.join("models", "nlu"))
+ARTIFACTS = ("intent_model.pkl", "vectorizer.pkl", "encoder.pkl", "slot_filling_crf_model.pkl")
+SMOKE_FILE = "smoke.jsonl"
+LEGACY_VERSION = "legacy"
+
+
+def list_versions():
+    if not os.path.isdir(BUNDLE_DIR):
+        return []
+    return sorted(d for d in os.listdir(BUNDLE_DIR)
+                  if os.path.isdir(os.path.join(BUNDLE_DIR, d)) and not d.startswith("."))
+
+
+def current_version():
+    try:
+        with open(os.path.join(BUNDLE_DIR, "CURRENT")) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def valid_name(version):
+    """A plain directory name: no path separators, "..", or hidden (staging) names."""
+    separators = [os.sep] + ([os.altsep] if os.altsep else [])
+    return (bool(version) and not version.startswith(".")
+            and not any(sep in version for sep in separators))
+
+
+def bundle_path(version):
+    if version == LEGACY_VERSION:
+        return "."
+    # Versions can come from an API request: only names of existing bundles resolve to a path
+    if not valid_name(version) or version not in list_versions():
+        raise FileNotFoundError(f"NLU bundle '{version}' not found in {BUNDLE_DIR}")
+    return os.path.join(BUNDLE_DIR, version)
+
+
+def resolve(version=None):
+    """(version, directory) of the requested bundle; defaults to CURRENT, then the working directory."""
+    version = version or current_version() or LEGACY_VERSION
+    return version, bundle_path(version)
+
+
+def set_current(version):
+    """Points CURRENT at `version` atomically (readers see the old or the new name, never a partial one)."""
+    bundle_path(version)
+    os.makedirs(BUNDLE_DIR, exist_ok=True)
+    tmp = os.path.join(BUNDLE_DIR, f".CURRENT.{os.getpid()}")
+    with open(tmp, "w") as f:
+        f.write(version + "\n")
+    os.replace(tmp, os.path.join(BUNDLE_DIR, "CURRENT"))
+
+
+def load_smoke_set(directory):
+    path = os.path.join(directory, SMOKE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [(row["text"], row["intent"]) for row in rows]
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def publish(version, source_dir=".", activate=False):
+    """Copies freshly trained artifacts from `source_dir` into a new bundle version."""
+    if not valid_name(version) or version == LEGACY_VERSION:
+        raise ValueError(f"Invalid NLU bundle version {version!r}")
+    target = os.path.join(BUNDLE_DIR, version)
+    if os.path.exists(target):
+        raise FileExistsError(f"NLU bundle '{version}' already exists")
+    staging = os.path.join(BUNDLE_DIR, f".{version}.staging")
+    os.makedirs(staging)
+    manifest = {"version": version, "created_at": datetime.datetime.now().isoformat(), "artifacts": {}}
+    for name in ARTIFACTS + (SMOKE_FILE,):
+        src = os.path.join(source_dir, name)
+        if not os.path.exists(src):
+            continue
+        shutil.copy2(src, os.path.join(staging, name))
+        manifest["artifacts"][name] = _sha256(src)
+    with open(os.path.join(staging, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    # The version directory appears complete or not at all
+    os.rename(staging, target)
+    if activate:
+        set_current(version)
+    return target
+
+
+if __name__ == "__main__":
+    # python nlu_bundles.py list
+    # python nlu_bundles.py publish <version> [source_dir] [--activate]
+    # python nlu_bundles.py activate <version>
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    command = args[0] if args else "list"
+    if command == "publish":
+        path = publish(args[1], args[2] if len(args) > 2 else ".", activate="--activate" in sys.argv)
+        print(f"✅ Published NLU bundle {args[1]} to {path}")
+    elif command == "activate":
+        set_current(args[1])
+        print(f"✅ CURRENT -> {args[1]} (running servers pick it up via NLU_BUNDLE_WATCH_SECONDS or /admin/nlu/reload)")
+    else:
+        active = current_version()
+        for v in list_versions():
+            print(f"{'*' if v == active else ' '} {v}")
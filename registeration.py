@@ -6,9 +6,9 @@ from numpy.linalg import norm
 import soundfile as sf
 from pathlib import Path
 import numpy as np
-import io
 import os
 from database import User, get_db_session # Import for DB interaction
+from embedding_codec import encode_embedding
 import sys
 
 # Ensure the Voice Encoder is loaded at startup
@@ -22,10 +22,8 @@ except Exception as e:
 
 def serialize_embedding(embedding):
     """Converts a numpy array (embedding) to a binary format for database storage."""
-    # Use io.BytesIO to simulate a file and numpy.save to write binary data
-    with io.BytesIO() as f:
-        np.save(f, embedding)
-        return f.getvalue()
+    # Compact header + raw little-endian floats (see embedding_codec); EMBEDDING_DTYPE=float16 halves it
+    return encode_embedding(embedding, dtype=os.getenv("EMBEDDING_DTYPE", "float32"))
 
 def amplify_audio(audio, target_peak=0.8):
         current_peak = np.max(np.abs(audio)) + 1e-8
@@ -106,6 +104,9 @@ def registeration():
 
         if user:
             user.voice_embedding = db_embedding
+            # This script runs in its own process: running servers pick the new embedding up by
+            # comparing this version with their cached copy (EMBEDDING_REVALIDATE_SECONDS)
+            user.voice_embedding_version = (user.voice_embedding_version or 0) + 1
             db.commit()
             print(f"\n✅ Mean embedding stored in the database for User ID {db_id}.")
         else:
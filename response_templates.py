@@ -0,0 +1,188 @@
+# response_templates.py
+# Response catalog keyed by (intent, sub-intent) with stored translations, rendered locally.
+# Replaces the per-request machine translation of route_to_db's English answers.
+import string
+from decimal import Decimal, ROUND_HALF_UP
+
+DEFAULT_LANGUAGE = "en"
+
+TEMPLATES = {
+    ("check_balance", None): {
+        "en": "Your balance is {balance:money}.",
+        "hi": "आपका बैलेंस {balance:money} है।",
+    },
+    ("check_balance", "no_account"): {
+        "en": "No account.",
+        "hi": "कोई खाता नहीं मिला।",
+    },
+    ("make_payment", "missing_amount"): {
+        "en": "Please specify the amount you wish to transfer.",
+        "hi": "कृपया वह राशि बताएं जो आप ट्रांसफर करना चाहते हैं।",
+    },
+    ("make_payment", "no_account"): {
+        "en": "No account found to process payment.",
+        "hi": "भुगतान के लिए कोई खाता नहीं मिला।",
+    },
+    ("make_payment", "success"): {
+        "en": "Successfully transferred {amount:money}. Your new balance is {balance:money}.",
+        "hi": "{amount:money} सफलतापूर्वक ट्रांसफर किए गए। आपका नया बैलेंस {balance:money} है।",
+    },
+    ("make_payment", "insufficient_funds"): {
+        "en": "Insufficient balance. Your current balance is only {balance:money}.",
+        "hi": "अपर्याप्त बैलेंस। आपका वर्तमान बैलेंस केवल {balance:money} है।",
+    },
+    ("make_payment", "invalid_amount"): {
+        "en": "I could not understand the transfer amount. Please provide a valid number.",
+        "hi": "मैं ट्रांसफर की राशि समझ नहीं पाया। कृपया एक मान्य संख्या बताएं।",
+    },
+    ("make_payment", "error"): {
+        "en": "An unexpected error occurred while trying to process the payment.",
+        "hi": "भुगतान करते समय एक अनपेक्षित त्रुटि हुई।",
+    },
+    ("make_payment", "preview"): {
+        "en": "Payment of {amount:money} to {recipient} was not executed (batch replay).",
+        "hi": "{recipient} को {amount:money} का भुगतान नहीं किया गया (बैच रीप्ले)।",
+    },
+    ("loan_inquiry", "loan_status"): {
+        "en": "Your {loan_type:term} status is: {status:term}.",
+        "hi": "आपके {loan_type:term} की स्थिति: {status:term}।",
+    },
+    ("loan_inquiry", "no_loans"): {
+        "en": "No active loans.",
+        "hi": "कोई सक्रिय लोन नहीं है।",
+    },
+    ("loan_inquiry", None): {
+        "en": "You are eligible for a Personal Loan.",
+        "hi": "आप पर्सनल लोन के लिए पात्र हैं।",
+    },
+    ("credit_limit", "no_card"): {
+        "en": "No credit card found.",
+        "hi": "कोई क्रेडिट कार्ड नहीं मिला।",
+    },
+    ("credit_limit", "credit_limit_used"): {
+        "en": "Used limit: {amount:money}",
+        "hi": "उपयोग की गई लिमिट: {amount:money}",
+    },
+    ("credit_limit", None): {
+        "en": "Available limit: {amount:money}",
+        "hi": "उपलब्ध लिमिट: {amount:money}",
+    },
+    ("transaction_history", "empty"): {
+        "en": "I couldn't find any recent transactions for your account.",
+        "hi": "आपके खाते में कोई हालिया लेन-देन नहीं मिला।",
+    },
+    ("transaction_history", "header"): {
+        "en": "Your three most recent transactions are:",
+        "hi": "आपके तीन सबसे हाल के लेन-देन:",
+    },
+    ("transaction_history", "line"): {
+        "en": "On {date}, a {type:term} of {amount:money} for {description}.",
+        "hi": "{date} को, {description} के लिए {amount:money} का {type:term}।",
+    },
+    ("transaction_history", "range_header"): {
+        "en": "Your transactions from {start} to {end}:",
+        "hi": "{start} से {end} तक आपके लेन-देन:",
+    },
+    ("transaction_history", "range_empty"): {
+        "en": "I couldn't find any transactions between {start} and {end}.",
+        "hi": "{start} और {end} के बीच कोई लेन-देन नहीं मिला।",
+    },
+    ("transaction_history", "more"): {
+        "en": "There are more transactions in this period. Ask for a shorter range or download the full statement.",
+        "hi": "इस अवधि में और भी लेन-देन हैं। कृपया छोटी अवधि पूछें या पूरा स्टेटमेंट डाउनलोड करें।",
+    },
+    ("spending_summary", None): {
+        "en": "You spent {amount:money} between {start} and {end}. Number of payments: {count}.",
+        "hi": "{start} से {end} के बीच आपने {amount:money} खर्च किए। भुगतानों की संख्या: {count}।",
+    },
+    ("spending_summary", "category"): {
+        "en": "You spent {amount:money} on {category:term} between {start} and {end}. Number of payments: {count}.",
+        "hi": "{start} से {end} के बीच आपने {category:term} पर {amount:money} खर्च किए। भुगतानों की संख्या: {count}।",
+    },
+    ("invalid_date", None): {
+        "en": "I couldn't understand the date in your question. Try something like \"since 1 March\" or \"last 7 days\".",
+        "hi": "मैं आपके प्रश्न की तारीख नहीं समझ पाया। कृपया \"1 मार्च से\" या \"पिछले 7 दिन\" जैसा कुछ पूछें।",
+    },
+    ("fallback", None): {
+        "en": "I processed your request but need more training on this specific topic.",
+        "hi": "मैंने आपका अनुरोध प्राप्त किया, लेकिन इस विषय पर मुझे और प्रशिक्षण की आवश्यकता है।",
+    },
+}
+
+# Fixed values that come from the database (loan types, statuses, transaction types, spending categories)
+TERMS = {
+    "hi": {
+        "Debit": "डेबिट",
+        "Credit": "क्रेडिट",
+        "Approved": "स्वीकृत",
+        "Pending": "लंबित",
+        "Rejected": "अस्वीकृत",
+        "Home Loan": "होम लोन",
+        "Personal Loan": "पर्सनल लोन",
+        "Car Loan": "कार लोन",
+        "Education Loan": "एजुकेशन लोन",
+        "Cash": "नकद निकासी",
+        "Bills": "बिल",
+        "Transfers": "ट्रांसफर",
+        "Other": "अन्य",
+    },
+}
+
+# Digit grouping per locale: "western" = 2,500,000.00 ; "indian" = 25,00,000.00
+GROUPING = {"en-US": "western", "en-IN": "indian", "hi-IN": "indian"}
+CURRENCY_SYMBOL = "₹"
+
+
+def base_language(language):
+    return (language or DEFAULT_LANGUAGE).split("-")[0].lower()
+
+
+def supports(language):
+    """True when every template has a stored translation for this language."""
+    lang = base_language(language)
+    return all(lang in texts for texts in TEMPLATES.values())
+
+
+def _group(integer_digits, style):
+    if style == "indian" and len(integer_digits) > 3:
+        head, tail = integer_digits[:-3], integer_digits[-3:]
+        pairs = []
+        while len(head) > 2:
+            pairs.insert(0, head[-2:])
+            head = head[:-2]
+        return ",".join([head] + pairs + [tail])
+    return f"{int(integer_digits):,}"
+
+
+def format_currency(amount, language="en-US"):
+    """₹ amount with 2 decimals and the locale's digit grouping."""
+    value = Decimal(str(amount)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    sign = "-" if value < 0 else ""
+    integer, _, fraction = f"{abs(value):.2f}".partition(".")
+    style = GROUPING.get(language, "indian" if base_language(language) == "hi" else "western")
+    return f"{sign}{CURRENCY_SYMBOL}{_group(integer, style)}.{fraction}"
+
+
+class _CatalogFormatter(string.Formatter):
+    """Adds two format specs: {x:money} (locale currency) and {x:term} (glossary lookup)."""
+    def __init__(self, language):
+        self.language = language
+        self.terms = TERMS.get(base_language(language), {})
+
+    def format_field(self, value, format_spec):
+        if format_spec == "money":
+            if isinstance(value, (int, float, Decimal)):
+                return format_currency(value, self.language)
+            return str(value)
+        if format_spec == "term":
+            return self.terms.get(value, str(value))
+        return super().format_field(value, format_spec)
+
+
+def render(intent, variant=None, language="en-US", **values):
+    """Renders the catalog entry in `language`, falling back to English if it has no translation."""
+    texts = TEMPLATES[(intent, variant)]
+    lang = base_language(language)
+    if lang not in texts:
+        lang, language = DEFAULT_LANGUAGE, "en-US"
+    return _CatalogFormatter(language).format(texts[lang], **values)
@@ -0,0 +1,49 @@
+# serve.py
+# Multi-worker serving mode:  gunicorn -c serve.py main:app
+#
+# The app and its models are loaded once in the gunicorn master, before the workers fork.
+# Workers then share the model weights as copy-on-write pages instead of each loading a copy;
+# gc.freeze() keeps the collector from touching (and so copying) those objects later, and the
+# NLU arrays are additionally memory-mapped from disk (see model_artifacts.py).
+import gc
+import os
+import sys
+
+from model_registry import registry, names_from_env
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", 4))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("WORKER_TIMEOUT", 120))
+
+# PRELOAD_MODELS=nlu,whisper,voice_encoder (default: all registered models)
+PRELOAD_MODELS = names_from_env("PRELOAD_MODELS", "all")
+# Workers share one account snapshot cache file, so a payment in one worker invalidates it for all
+os.environ.setdefault("ACCOUNT_CACHE", "sqlite")
+# Every worker gets its own torch thread pool; keep it small so N workers do not oversubscribe the cores
+TORCH_THREADS = int(os.getenv("TORCH_THREADS_PER_WORKER", 1))
+
+
+def when_ready(server):
+    # Runs in the master after main:app was imported (preload_app) and before any worker forks.
+    # The schema, migrations and rollup backfill run here once: concurrent worker lifespans raced
+    # each other on CREATE TABLE and the demo data, and one failed lifespan stops the whole server
+    import main
+    main.prepare_database()
+    main.DATABASE_PREPARED = True
+    registry.warm_up(PRELOAD_MODELS, background=False)
+    gc.collect()
+    gc.freeze()
+    server.log.info("Models resident before fork: %s",
+                    [name for name, model in registry.models.items() if model.loaded])
+
+
+def post_fork(server, worker):
+    import database
+    # Connections opened by the master must not be shared with the children
+    database.engine.dispose(close=False)
+    database.async_engine.sync_engine.dispose(close=False)
+    database.ledger_engine.sync_engine.dispose(close=False)
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(TORCH_THREADS)
@@ -0,0 +1,199 @@
+# slot_rules.py
+# Deterministic fast path for the slots that regexes get right every time: amounts and account numbers.
+# Runs ahead of the CRF; only the tokens these patterns do not cover are sent to the CRF.
+import calendar
+import datetime
+import re
+from decimal import Decimal, InvalidOperation
+
+_NUMBER = r"\d{1,3}(?:,\d{2,3})+(?:\.\d+)?|\d+(?:\.\d+)?"
+# rs/inr must start a word: "brothers 500" or "Mrs 500" is not a rupee amount
+_CURRENCY_BEFORE = r"₹|(?<![a-z])(?:rs\.?|inr)"
+_CURRENCY_AFTER = r"rupees?|rs\.?|inr|₹"
+
+AMOUNT_PATTERN = re.compile(
+    rf"(?:(?:{_CURRENCY_BEFORE})\s*(?P<pre>{_NUMBER}))"
+    rf"|(?:(?<![\d,.])(?P<post>{_NUMBER})\s*(?:{_CURRENCY_AFTER})(?![a-z]))",
+    re.IGNORECASE,
+)
+# 9-10 digit account numbers, optionally introduced by "account number" / "a/c no." etc.
+ACCOUNT_PATTERN = re.compile(
+    r"(?:(?:account|a/c|acc)\.?\s*(?:number|num|no\.?)?\s*)?(?<![\d,.])(?P<number>\d{9,10})(?![\d,])",
+    re.IGNORECASE,
+)
+_TOKEN = re.compile(r"\S+")
+
+
+def parse_amount(value):
+    """
+    Normalizes an amount slot to a float: accepts numbers and strings such as
+    "500 rupees", "₹1,200", "Rs. 250.50" or "1000 INR". Raises ValueError otherwise.
+    """
+    if isinstance(value, (int, float, Decimal)):
+        return float(value)
+    match = AMOUNT_PATTERN.search(value)
+    if match:
+        number = match.group("pre") or match.group("post")
+    else:
+        match = re.search(_NUMBER, value)
+        if not match:
+            raise ValueError(f"No amount in {value!r}")
+        number = match.group(0)
+    try:
+        return float(Decimal(number.replace(",", "")))
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount {value!r}")
+
+
+def extract_rule_slots(text):
+    """
+    Returns (slots, remaining_tokens):
+    - slots: typed, normalized {"amount": float, "account_number": str} for whatever matched
+    - remaining_tokens: the whitespace tokens of `text` not covered by a match, for the CRF
+    """
+    slots = {}
+    spans = []
+
+    for match in ACCOUNT_PATTERN.finditer(text):
+        if "account_number" not in slots:
+            slots["account_number"] = match.group("number")
+        spans.append(match.span())
+
+    for match in AMOUNT_PATTERN.finditer(text):
+        if any(start < match.end() and match.start() < end for start, end in spans):
+            continue
+        if "amount" not in slots:
+            slots["amount"] = float(Decimal((match.group("pre") or match.group("post")).replace(",", "")))
+        spans.append(match.span())
+
+    if not spans:
+        return slots, text.split()
+
+    remaining = [
+        tok.group(0) for tok in _TOKEN.finditer(text)
+        if not any(start < tok.end() and tok.start() < end for start, end in spans)
+    ]
+    return slots, remaining
+
+
+# --- Dates for transaction_history ---
+# Relative dates depend on the day they are asked, so they are resolved per request
+# (parse_date_range) instead of being stored in the slot cache.
+MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): i for i, name in enumerate(calendar.month_abbr) if name})
+_MONTH = r"(?:" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")\.?"
+_DATE = (rf"\d{{4}}-\d{{2}}-\d{{2}}|\d{{1,2}}(?:st|nd|rd|th)?\s+{_MONTH}(?:,?\s+\d{{4}})?"
+         rf"|{_MONTH}\s+\d{{1,2}}(?:st|nd|rd|th)?(?:,?\s+\d{{4}})?|{_MONTH}(?:\s+\d{{4}})?|today|yesterday")
+
+RANGE_PATTERN = re.compile(rf"\b(?:from|between)\s+(?P<start>{_DATE})\s+(?:to|and|until|till)\s+(?P<end>{_DATE})\b", re.IGNORECASE)
+SINCE_PATTERN = re.compile(rf"\b(?:since|after|from)\s+(?P<start>{_DATE})\b", re.IGNORECASE)
+LAST_PATTERN = re.compile(r"\b(?P<which>last|past|previous)\s+(?:(?P<n>\d+)\s+)?(?P<unit>day|week|month|year)s?\b", re.IGNORECASE)
+THIS_PATTERN = re.compile(r"\bthis\s+(?P<unit>week|month|year)\b", re.IGNORECASE)
+IN_PATTERN = re.compile(rf"\b(?:in|for|during|of)\s+(?P<month>{_MONTH})(?:\s+(?P<year>\d{{4}}))?\b", re.IGNORECASE)
+DAY_PATTERN = re.compile(r"\b(?P<day>today|yesterday)(?:'s)?\b", re.IGNORECASE)
+
+
+def _months_back(day, months):
+    month_index = day.year * 12 + day.month - 1 - months
+    year, month = divmod(month_index, 12)
+    return datetime.date(year, month + 1, min(day.day, calendar.monthrange(year, month + 1)[1]))
+
+
+def parse_date(value, today=None, end_of_period=False):
+    """
+    One date expression -> datetime.date: "2026-01-05", "1 November", "Nov 5th, 2025",
+    "January" (first day, or last with end_of_period), "today", "yesterday".
+    Dates without a year are taken as the latest one not after today. Raises ValueError otherwise.
+    """
+    if isinstance(value, datetime.date):
+        return value
+    today = today or datetime.date.today()
+    text = value.strip().lower().rstrip(".")
+    if text == "today":
+        return today
+    if text == "yesterday":
+        return today - datetime.timedelta(days=1)
+    try:
+        return datetime.date.fromisoformat(text)
+    except ValueError:
+        pass
+
+    words = re.findall(r"[a-z]+|\d+", text)
+    month = next((MONTHS[w] for w in words if w in MONTHS), None)
+    numbers = [int(w) for w in words if w.isdigit()]
+    year = next((n for n in numbers if n >= 1000), None)
+    day = next((n for n in numbers if n <= 31), None)
+    if month is None:
+        raise ValueError(f"No date in {value!r}")
+
+    def build(y):
+        if day is not None:
+            return datetime.date(y, month, day)
+        return datetime.date(y, month, calendar.monthrange(y, month)[1] if end_of_period else 1)
+
+    if year is not None:
+        return build(year)
+    # "since December" asked in March means last December
+    candidate = datetime.date(today.year, month, day or 1)
+    return build(today.year if candidate <= today else today.year - 1)
+
+
+def parse_date_range(text, today=None):
+    """
+    Date range asked for in `text` -> (start, end) as datetime.date, or None.
+    Understands "from 1 November to 5 November", "between 5 March and 9 March", "since January",
+    "last 3 days", "past month", "last month", "this year", "in March", "today", "yesterday".
+    "last month" / "last year" are the previous calendar month / year; counted or "past" periods
+    ("last 3 months", "past month") are rolling windows ending today.
+    """
+    today = today or datetime.date.today()
+
+    match = RANGE_PATTERN.search(text)
+    if match:
+        start = parse_date(match.group("start"), today)
+        end = parse_date(match.group("end"), today, end_of_period=True)
+        if end < start:  # "from 20 December to 5 January"
+            start = start.replace(year=start.year - 1)
+        return start, end
+
+    match = SINCE_PATTERN.search(text)
+    if match:
+        return parse_date(match.group("start"), today), today
+
+    match = LAST_PATTERN.search(text)
+    if match:
+        n = int(match.group("n") or 1)
+        unit = match.group("unit").lower()
+        if match.group("n") is None and match.group("which").lower() != "past":
+            if unit == "month":
+                end = today.replace(day=1) - datetime.timedelta(days=1)
+                return end.replace(day=1), end
+            if unit == "year":
+                return datetime.date(today.year - 1, 1, 1), datetime.date(today.year - 1, 12, 31)
+        if unit == "day":
+            return today - datetime.timedelta(days=n), today
+        if unit == "week":
+            return today - datetime.timedelta(weeks=n), today
+        return _months_back(today, n * (12 if unit == "year" else 1)), today
+
+    match = THIS_PATTERN.search(text)
+    if match:
+        unit = match.group("unit").lower()
+        if unit == "week":
+            return today - datetime.timedelta(days=today.weekday()), today
+        if unit == "month":
+            return today.replace(day=1), today
+        return today.replace(month=1, day=1), today
+
+    match = IN_PATTERN.search(text)
+    if match:
+        expression = match.group("month") + (f" {match.group('year')}" if match.group("year") else "")
+        start = parse_date(expression, today)
+        return start, min(parse_date(expression, today, end_of_period=True), today)
+
+    match = DAY_PATTERN.search(text)
+    if match:
+        day = parse_date(match.group("day"), today)
+        return day, day
+
+    return None
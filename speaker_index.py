@@ -0,0 +1,159 @@
+# speaker_index.py
+# 1:N speaker identification: every enrolled embedding in one contiguous normalized matrix.
+import os
+import threading
+import time
+
+import numpy as np
+
+from database import User, get_db_session
+from embedding_codec import decode_matrix
+
+EMBEDDING_DIM = 256  # Resemblyzer VoiceEncoder output size
+SYNC_SECONDS = float(os.getenv("SPEAKER_INDEX_SYNC_SECONDS", 30))
+
+
+class SpeakerIndex:
+    """
+    Rows of `_matrix[:size]` are L2-normalized float32 embeddings; `_ids[i]` is the user of row i.
+    identify() is a single matrix-vector product plus argpartition, so it stays cheap at
+    thousands of users. Removal swaps the last row into the hole to keep the block contiguous.
+    With backing_file the matrix lives in a np.memmap (file-backed pages instead of anonymous memory).
+    """
+    def __init__(self, dim=EMBEDDING_DIM, capacity=1024, backing_file=None):
+        self.dim = dim
+        self.backing_file = backing_file
+        self._lock = threading.Lock()
+        self._size = 0
+        self._row_of = {}       # user_id -> row
+        self._versions = {}     # user_id -> users.voice_embedding_version at load time
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._matrix = self._allocate(capacity)
+        self._last_sync = 0.0
+
+    def _allocate(self, capacity):
+        if self.backing_file:
+            return np.memmap(self.backing_file, dtype=np.float32, mode="w+", shape=(capacity, self.dim))
+        return np.zeros((capacity, self.dim), dtype=np.float32)
+
+    def _grow(self):
+        capacity = len(self._ids) * 2
+        # Copy the live block first: with a backing file the new mapping recreates the file
+        live = np.array(self._matrix[:self._size])
+        self._matrix = self._allocate(capacity)
+        self._matrix[:self._size] = live
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        self._ids = ids
+
+    def __len__(self):
+        return self._size
+
+    def add(self, user_id, embedding, version=0):
+        """Adds or replaces a user's embedding."""
+        vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        vector = vector / (np.linalg.norm(vector) + 1e-12)
+        with self._lock:
+            row = self._row_of.get(user_id)
+            if row is None:
+                if self._size == len(self._ids):
+                    self._grow()
+                row = self._size
+                self._size += 1
+                self._row_of[user_id] = row
+                self._ids[row] = user_id
+            self._matrix[row] = vector
+            self._versions[user_id] = version
+
+    def add_many(self, user_ids, matrix, versions=None):
+        """Bulk add: normalizes the whole (n, dim) block at once."""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        matrix = matrix / (np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12)
+        versions = versions or [0] * len(user_ids)
+        for user_id, vector, version in zip(user_ids, matrix, versions):
+            self.add(user_id, vector, version)
+
+    def remove(self, user_id):
+        with self._lock:
+            row = self._row_of.pop(user_id, None)
+            if row is None:
+                return False
+            self._versions.pop(user_id, None)
+            last = self._size - 1
+            if row != last:
+                moved = int(self._ids[last])
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = moved
+                self._row_of[moved] = row
+            self._size = last
+            return True
+
+    def identify(self, embedding, top_k=1):
+        """Returns [(user_id, cosine_score), ...] best first."""
+        query = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        query = query / (np.linalg.norm(query) + 1e-12)
+        with self._lock:
+            n = self._size
+            if n == 0:
+                return []
+            scores = self._matrix[:n] @ query
+            ids = self._ids[:n].copy()
+        k = min(top_k, n)
+        if k < n:
+            top = np.argpartition(scores, -k)[-k:]
+        else:
+            top = np.arange(n)
+        top = top[np.argsort(scores[top])[::-1]]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def load_from_db(self):
+        """Bulk-loads every enrolled embedding (startup)."""
+        db = get_db_session()
+        try:
+            rows = (db.query(User.id, User.voice_embedding, User.voice_embedding_version)
+                    .filter(User.voice_embedding.isnot(None)).all())
+        finally:
+            db.close()
+        self._add_rows(rows)
+        self._last_sync = time.monotonic()
+        return len(rows)
+
+    def _add_rows(self, rows):
+        if not rows:
+            return
+        user_ids, blobs, versions = zip(*rows)
+        self.add_many(list(user_ids), decode_matrix(blobs), [v or 0 for v in versions])
+
+    def sync_from_db(self, force=False):
+        """
+        Picks up enrollments written by other processes (registeration.py): compares only the
+        version column for every user and re-reads the blobs that changed.
+        """
+        if not force and time.monotonic() - self._last_sync < SYNC_SECONDS:
+            return 0
+        db = get_db_session()
+        try:
+            versions = dict(db.query(User.id, User.voice_embedding_version)
+                            .filter(User.voice_embedding.isnot(None)).all())
+            stale = [uid for uid, v in versions.items() if self._versions.get(uid) != (v or 0)]
+            rows = []
+            if stale:
+                rows = (db.query(User.id, User.voice_embedding, User.voice_embedding_version)
+                        .filter(User.id.in_(stale)).all())
+        finally:
+            db.close()
+        self._add_rows(rows)
+        with self._lock:
+            removed = [uid for uid in self._row_of if uid not in versions]
+        for user_id in removed:
+            self.remove(user_id)
+        self._last_sync = time.monotonic()
+        return len(rows)
+
+    def stats(self):
+        return {"enrolled": self._size, "capacity": len(self._ids), "dim": self.dim,
+                "memory_mapped": bool(self.backing_file)}
+
+
+# Singleton instance (SPEAKER_INDEX_FILE=path to back the matrix with a memory-mapped file)
+speaker_index = SpeakerIndex(backing_file=os.getenv("SPEAKER_INDEX_FILE") or None)
@@ -0,0 +1,179 @@
+# spending.py
+# Spending summaries ("how much did I spend this month?", "total debits on Amazon") from rollups.
+#
+# Every debit adds its amount to four SpendingRollup rows: (its category and "*") x (its day and its
+# month). The ledger writes them in the payment's own transaction, so rollups never disagree with
+# the transactions table. A summary over a date range reads one row per month it fully covers plus
+# the day rows of the (at most two) partial months at its edges, however long the history is.
+import calendar
+import datetime
+import re
+import sys
+from collections import defaultdict
+from decimal import Decimal
+
+from sqlalchemy import and_, delete, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database import SpendingRollup, Transaction, get_db_session
+
+ALL_CATEGORIES = "*"
+OTHER = "Other"
+
+# Category of a debit, from its description; the first match wins
+CATEGORY_RULES = [
+    ("Amazon", re.compile(r"amazon", re.IGNORECASE)),
+    ("Flipkart", re.compile(r"flipkart", re.IGNORECASE)),
+    ("Cash", re.compile(r"\batm\b|\bcash\b", re.IGNORECASE)),
+    ("Bills", re.compile(r"\bbills?\b|electricity|recharge", re.IGNORECASE)),
+    ("Transfers", re.compile(r"\btransfer", re.IGNORECASE)),
+]
+
+
+def categorize(description):
+    return category_in(description or "") or OTHER
+
+
+def category_in(text):
+    """The category a question or description mentions ("total debits on Amazon" -> "Amazon"), or None."""
+    for category, pattern in CATEGORY_RULES:
+        if pattern.search(text):
+            return category
+    return None
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def month_end(day):
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def _periods(day):
+    return (("day", day), ("month", month_start(day)))
+
+
+def add_debit(deltas, user_id, day, category, amount):
+    """Accumulates one debit into `deltas` ({rollup key: [total, count]}), e.g. for a whole ledger group."""
+    for c in (category, ALL_CATEGORIES):
+        for period, start in _periods(day):
+            delta = deltas.setdefault((user_id, c, period, start), [Decimal("0.00"), 0])
+            delta[0] += amount
+            delta[1] += 1
+    return deltas
+
+
+def _build_upsert(insert_):
+    """INSERT ... ON CONFLICT DO UPDATE adding to the existing totals."""
+    statement = insert_(SpendingRollup)
+    return statement.on_conflict_do_update(
+        index_elements=["user_id", "category", "period", "period_start"],
+        set_={"total": SpendingRollup.total + statement.excluded.total,
+              "count": SpendingRollup.count + statement.excluded.count})
+
+
+# Built once and run with executemany: a statement with the rows inlined as VALUES would be
+# compiled again for every payment, which cost more than the upsert itself
+_UPSERTS = {"postgresql": _build_upsert(postgresql.insert), "sqlite": _build_upsert(sqlite.insert)}
+
+
+def _rows(deltas):
+    return [{"user_id": user_id, "category": c, "period": period, "period_start": start, "total": total, "count": count}
+            for (user_id, c, period, start), (total, count) in deltas.items()]
+
+
+async def apply(db, deltas):
+    """Adds accumulated deltas to the rollups: one statement, inside the caller's transaction."""
+    if deltas:
+        await db.execute(_UPSERTS[db.bind.dialect.name], _rows(deltas))
+
+
+async def record_debit(db, user_id, day, category, amount):
+    """Adds one debit to its four rollup rows."""
+    await apply(db, add_debit({}, user_id, day, category, amount))
+
+
+def covering(start, end):
+    """Splits [start, end] into the months it fully covers and the day ranges of partial months."""
+    months, days = [], []
+    first = month_start(start)
+    while first <= end:
+        last = month_end(first)
+        lo, hi = max(start, first), min(end, last)
+        if (lo, hi) == (first, last):
+            months.append(first)
+        else:
+            days.append((lo, hi))
+        first = last + datetime.timedelta(days=1)
+    return months, days
+
+
+async def spend_between(db, user_id, start, end, category=None):
+    """(total, count) of the user's debits in [start, end], optionally for one category."""
+    months, days = covering(start, end)
+    periods = [and_(SpendingRollup.period == "day", SpendingRollup.period_start.between(lo, hi)) for lo, hi in days]
+    if months:
+        periods.append(and_(SpendingRollup.period == "month", SpendingRollup.period_start.in_(months)))
+    rows = await db.execute(select(SpendingRollup.total, SpendingRollup.count).where(
+        SpendingRollup.user_id == user_id,
+        SpendingRollup.category == (category or ALL_CATEGORIES),
+        or_(*periods)))
+    total, count = Decimal("0.00"), 0
+    for row_total, row_count in rows:
+        total += row_total
+        count += row_count
+    return total, count
+
+
+def rebuild(db):
+    """
+    Recomputes every rollup from the transactions table (sync session, caller commits).
+    Debits written before categories existed get their category stored on the way.
+    """
+    totals = {}
+    uncategorized = defaultdict(list)
+    debits = db.execute(select(Transaction.id, Transaction.user_id, Transaction.transaction_date,
+                               Transaction.description, Transaction.category, Transaction.amount)
+                        .where(Transaction.transaction_type == "Debit", Transaction.transaction_date.isnot(None)))
+    for row_id, user_id, day, description, category, amount in debits.all():
+        if category is None:
+            category = categorize(description)
+            uncategorized[category].append(row_id)
+        add_debit(totals, user_id, day, category, amount)
+
+    for category, ids in uncategorized.items():
+        for i in range(0, len(ids), 500):
+            db.execute(update(Transaction).where(Transaction.id.in_(ids[i:i + 500])).values(category=category))
+    db.execute(delete(SpendingRollup))
+    if totals:
+        db.execute(insert(SpendingRollup), _rows(totals))
+    return len(totals)
+
+
+def backfill():
+    """Builds the rollups on the first start after upgrading: the table is empty but debits exist."""
+    db = get_db_session()
+    try:
+        if db.scalar(select(SpendingRollup.user_id).limit(1)) is not None:
+            return 0
+        if db.scalar(select(Transaction.id).where(Transaction.transaction_type == "Debit").limit(1)) is None:
+            return 0
+        rows = rebuild(db)
+        db.commit()
+        print(f"📊 Built {rows} spending rollup rows from the transaction history")
+        return rows
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    # python spending.py rebuild   (e.g. after correcting transactions by hand)
+    if sys.argv[1:] == ["rebuild"]:
+        session = get_db_session()
+        try:
+            count = rebuild(session)
+            session.commit()
+        finally:
+            session.close()
+        print(f"✅ Rebuilt {count} spending rollup rows")
@@ -0,0 +1,122 @@
+# streaming.py
+# Voice-activity segmentation for the streaming WebSocket endpoint.
+import numpy as np
+
+from audio_decoder import SAMPLE_RATE, AudioFrame
+
+FRAME_MS = 30
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+
+
+def pcm16_to_float32(data):
+    """Client chunks are raw 16-bit little-endian mono PCM at 16 kHz."""
+    return np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+
+
+class PCM16Stream:
+    """
+    pcm16_to_float32 over a stream of client chunks, which need not end on a sample boundary:
+    a trailing odd byte is kept and completed by the next chunk.
+    """
+    def __init__(self):
+        self._odd = b""
+
+    def feed(self, data):
+        data = self._odd + data
+        whole = len(data) - len(data) % 2
+        self._odd = data[whole:]
+        return pcm16_to_float32(data[:whole])
+
+
+class VADSegmenter:
+    """
+    Energy-based voice activity detection over 30 ms frames.
+    - A pause of segment_silence_ms after speech closes a *segment* (sent to Whisper right away)
+    - A pause of endpoint_silence_ms after speech closes the *utterance* (triggers NLU)
+    The noise floor adapts to the quietest recent frames, so a fixed mic gain is not assumed.
+    """
+    def __init__(self, segment_silence_ms=300, endpoint_silence_ms=800, min_speech_ms=200,
+                 max_segment_s=25, energy_ratio=3.0, min_energy=0.005):
+        self.segment_silence_frames = segment_silence_ms // FRAME_MS
+        self.endpoint_silence_frames = endpoint_silence_ms // FRAME_MS
+        self.min_speech_frames = max(1, min_speech_ms // FRAME_MS)
+        self.max_segment_frames = int(max_segment_s * 1000 // FRAME_MS)
+        self.energy_ratio = energy_ratio
+        self.min_energy = min_energy
+
+        self._remainder = np.zeros(0, dtype=np.float32)
+        self._noise_floor = None
+        self._segment = []          # frames of the open segment
+        self._speech_frames = 0     # voiced frames in the open segment
+        self._silence_run = 0       # consecutive unvoiced frames since the last voiced one
+        self._utterance_open = False
+
+    def _is_speech(self, frame):
+        energy = float(np.sqrt(np.mean(frame * frame)))
+        if self._noise_floor is None:
+            self._noise_floor = energy
+        threshold = max(self.min_energy, self._noise_floor * self.energy_ratio)
+        voiced = energy > threshold
+        if not voiced:
+            # Track the background level slowly, only from unvoiced frames
+            self._noise_floor = 0.95 * self._noise_floor + 0.05 * energy
+        return voiced
+
+    def _close_segment(self):
+        frames, speech = self._segment, self._speech_frames
+        self._segment, self._speech_frames = [], 0
+        if speech < self.min_speech_frames:
+            return None
+        return AudioFrame(np.concatenate(frames), source="stream")
+
+    def feed(self, samples):
+        """
+        Consumes float32 samples and returns a list of events:
+        ("segment", AudioFrame) for each finished speech segment and ("endpoint", None)
+        once the speaker has stopped talking.
+        """
+        events = []
+        audio = np.concatenate([self._remainder, samples]) if len(self._remainder) else samples
+        usable = len(audio) - len(audio) % FRAME_SAMPLES
+        self._remainder = audio[usable:].copy()
+
+        for start in range(0, usable, FRAME_SAMPLES):
+            frame = audio[start:start + FRAME_SAMPLES]
+            voiced = self._is_speech(frame)
+
+            if voiced:
+                self._utterance_open = True
+                self._silence_run = 0
+                self._speech_frames += 1
+                self._segment.append(frame)
+            elif self._segment:
+                self._silence_run += 1
+                self._segment.append(frame)  # keep short pauses inside the segment
+            elif self._utterance_open:
+                self._silence_run += 1
+
+            if self._segment and (self._silence_run >= self.segment_silence_frames
+                                  or len(self._segment) >= self.max_segment_frames):
+                segment = self._close_segment()
+                if segment is not None:
+                    events.append(("segment", segment))
+
+            if self._utterance_open and self._silence_run >= self.endpoint_silence_frames:
+                self._utterance_open = False
+                self._silence_run = 0
+                events.append(("endpoint", None))
+        return events
+
+    def flush(self):
+        """Closes whatever is open (client said it is done speaking)."""
+        events = []
+        if self._segment:
+            segment = self._close_segment()
+            if segment is not None:
+                events.append(("segment", segment))
+        if self._utterance_open or events:
+            events.append(("endpoint", None))
+        self._utterance_open = False
+        self._silence_run = 0
+        self._remainder = np.zeros(0, dtype=np.float32)
+        return events
@@ -0,0 +1,115 @@
+# stress_ledger.py
+# Concurrency stress test for ledger.py: many concurrent debits (plus duplicate retries) against
+# a scratch SQLite database, then checks that no money was lost, created or double-charged, and
+# that the spending rollups written alongside each payment add up to the same totals.
+#
+#   python stress_ledger.py [payments] [concurrency]
+#
+# Runs once with one commit per payment and once with group commit, and prints throughput.
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+SCRATCH_DB = os.path.join(tempfile.mkdtemp(prefix="ledger-stress-"), "ledger.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{SCRATCH_DB}"
+
+from sqlalchemy import delete, func, select  # noqa: E402
+
+import database  # noqa: E402
+from database import Account, IdempotencyKey, SpendingRollup, Transaction, User  # noqa: E402
+from ledger import Ledger  # noqa: E402
+from spending import ALL_CATEGORIES  # noqa: E402
+
+USERS = 5
+
+
+def reset(opening_balance):
+    database.Base.metadata.create_all(bind=database.engine)
+    db = database.get_db_session()
+    try:
+        for model in (SpendingRollup, IdempotencyKey, Transaction, Account, User):
+            db.execute(delete(model))
+        for i in range(1, USERS + 1):
+            db.add(User(id=i, name=f"Stress {i}"))
+            db.add(Account(user_id=i, account_number=f"90000000{i:02d}", balance=opening_balance))
+        db.commit()
+    finally:
+        db.close()
+
+
+async def run(ledger, payments, concurrency):
+    rng = random.Random(7)
+    # Amounts with paise: balances are integer paise, so the sums must come out exact
+    jobs = [(rng.randint(1, USERS), Decimal(rng.randint(100, 4000)) / 100, f"key-{i}") for i in range(payments)]
+    # Every 10th payment is sent twice with the same key (a client retry)
+    jobs += [jobs[i] for i in range(0, payments, 10)]
+    rng.shuffle(jobs)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    results = {}
+
+    async def pay(user_id, amount, key):
+        async with semaphore:
+            result = await ledger.debit(user_id, amount, "Stress transfer", idempotency_key=key)
+            results.setdefault(key, []).append(result)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(pay(*job) for job in jobs))
+    return jobs, results, time.perf_counter() - start
+
+
+def check(jobs, results, opening_balance):
+    db = database.get_db_session()
+    try:
+        balances = dict(db.execute(select(Account.user_id, Account.balance)).all())
+        debited = dict(db.execute(select(Transaction.user_id, func.sum(Transaction.amount))
+                                  .group_by(Transaction.user_id)).all())
+        transactions = db.scalar(select(func.count(Transaction.id)))
+        rolled_up = dict(db.execute(select(SpendingRollup.user_id, func.sum(SpendingRollup.total))
+                                    .where(SpendingRollup.category == ALL_CATEGORIES, SpendingRollup.period == "month")
+                                    .group_by(SpendingRollup.user_id)).all())
+    finally:
+        db.close()
+
+    succeeded = {key for key, rs in results.items() if any(r.status == "success" for r in rs)}
+    expected = {}
+    for user_id, amount, key in {job[2]: job for job in jobs}.values():
+        if key in succeeded:
+            expected[user_id] = expected.get(user_id, 0) + amount
+
+    for user_id, balance in balances.items():
+        assert balance >= 0, f"user {user_id} overdrawn: {balance}"
+        assert balance == opening_balance - expected.get(user_id, 0), f"user {user_id} balance {balance} is wrong"
+        assert debited.get(user_id, 0) == expected.get(user_id, 0), f"user {user_id} ledger does not match"
+        assert rolled_up.get(user_id, 0) == expected.get(user_id, 0), f"user {user_id} rollups do not match"
+    assert transactions == len(succeeded), f"{transactions} transactions for {len(succeeded)} payments (double charge)"
+    for key, rs in results.items():
+        # A retry of a successful payment must replay it, not debit again
+        if len(rs) > 1 and any(r.status == "success" for r in rs):
+            assert len({r.transaction_id for r in rs if r.status == "success"}) == 1, f"{key} charged twice"
+            # ...even when the balance no longer covers it by the time the retry arrives
+            assert all(r.status == "success" for r in rs), f"retry of successful {key} reported {[r.status for r in rs]}"
+    return len(succeeded)
+
+
+async def main(payments, concurrency):
+    # Total demand is ~2x the money available, so many payments must be declined, not overdrawn
+    opening_balance = Decimal(payments * 20 // USERS // 2)
+    for group_commit in (False, True):
+        reset(opening_balance)
+        ledger = Ledger(group_commit=group_commit)
+        jobs, results, elapsed = await run(ledger, payments, concurrency)
+        succeeded = check(jobs, results, opening_balance)
+        mode = "group commit" if group_commit else "commit per payment"
+        print(f"✅ {mode:<20} {len(jobs)} requests, {succeeded} debited, "
+              f"{len(jobs) / elapsed:,.0f} req/s  {ledger.stats()}")
+    await database.ledger_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000,
+                     int(sys.argv[2]) if len(sys.argv) > 2 else 100))
@@ -0,0 +1,56 @@
+# test_chat_dates.py
+# Date questions through /chat and /chat/batch, on a scratch SQLite database.
+#
+#   python -m pytest -q test_chat_dates.py
+import os
+import tempfile
+
+SCRATCH_DIR = tempfile.mkdtemp(prefix="chat-dates-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(SCRATCH_DIR, 'bank.db')}"
+os.environ["ACCOUNT_CACHE_PATH"] = os.path.join(SCRATCH_DIR, "account_cache.db")
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+import ml_service  # noqa: E402
+from response_templates import render  # noqa: E402
+
+# Intents are fixed per message, so the tests do not depend on a trained bundle being present
+INTENTS = {
+    "show my transactions since 31 February": "transaction_history",
+    "how much did I spend since 30 feb": "spending_summary",
+    "show my transactions since 2026-13-01": "transaction_history",
+    "show my transactions since 1 January": "transaction_history",
+    "what is my balance": "check_balance",
+}
+INVALID = ["show my transactions since 31 February", "how much did I spend since 30 feb",
+           "show my transactions since 2026-13-01"]
+
+
+@pytest.fixture(scope="module")
+def client():
+    engine = ml_service.get_engine()
+    original = engine.predict_intents
+    engine.predict_intents = lambda texts: [INTENTS[t] for t in texts]
+    try:
+        with TestClient(main.app) as c:
+            yield c
+    finally:
+        engine.predict_intents = original
+
+
+@pytest.mark.parametrize("message", INVALID)
+def test_chat_answers_invalid_dates(client, message):
+    response = client.post("/chat", json={"message": message})
+    assert response.status_code == 200
+    assert response.json()["response"] == render("invalid_date")
+
+
+def test_batch_answers_invalid_dates_alongside_other_messages(client):
+    messages = INVALID + ["show my transactions since 1 January", "what is my balance"]
+    response = client.post("/chat/batch", json={"messages": [{"message": m} for m in messages]})
+    assert response.status_code == 200
+    answers = [r["response"] for r in response.json()["results"]]
+    assert answers[:3] == [render("invalid_date")] * 3
+    assert render("invalid_date") not in answers[3:]
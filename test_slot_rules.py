@@ -0,0 +1,37 @@
+# test_slot_rules.py
+# Date ranges from slot_rules.parse_date_range around month and year boundaries.
+#
+#   python -m pytest -q test_slot_rules.py
+import datetime
+
+import pytest
+
+from slot_rules import parse_date_range
+
+D = datetime.date
+
+
+@pytest.mark.parametrize("text, today, expected", [
+    # "last month" / "last year": the previous calendar period
+    ("what is my total spending last month", D(2026, 10, 18), (D(2026, 9, 1), D(2026, 9, 30))),
+    ("what is my total spending last month", D(2026, 10, 1), (D(2026, 9, 1), D(2026, 9, 30))),
+    ("what is my total spending last month", D(2026, 10, 31), (D(2026, 9, 1), D(2026, 9, 30))),
+    ("show my transactions from last month", D(2026, 3, 1), (D(2026, 2, 1), D(2026, 2, 28))),
+    ("show my transactions from last month", D(2024, 3, 31), (D(2024, 2, 1), D(2024, 2, 29))),
+    ("how much did I spend the previous month", D(2026, 1, 1), (D(2025, 12, 1), D(2025, 12, 31))),
+    ("how much did I spend last year", D(2026, 1, 1), (D(2025, 1, 1), D(2025, 12, 31))),
+    # Counted and "past" periods: rolling windows ending today
+    ("transactions in the last 3 days", D(2026, 3, 1), (D(2026, 2, 26), D(2026, 3, 1))),
+    ("transactions in the last 2 weeks", D(2026, 10, 1), (D(2026, 9, 17), D(2026, 10, 1))),
+    ("spending over the past month", D(2026, 3, 31), (D(2026, 2, 28), D(2026, 3, 31))),
+    ("spending in the last 2 months", D(2026, 10, 18), (D(2026, 8, 18), D(2026, 10, 18))),
+    ("spending in the last 1 month", D(2026, 10, 1), (D(2026, 9, 1), D(2026, 10, 1))),
+])
+def test_last_periods(text, today, expected):
+    assert parse_date_range(text, today) == expected
+
+
+@pytest.mark.parametrize("text", ["since 31 February", "since 30 feb", "since 2026-13-01"])
+def test_dates_that_do_not_exist_raise(text):
+    with pytest.raises(ValueError):
+        parse_date_range(text, D(2026, 10, 18))
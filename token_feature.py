@@ -31,4 +31,66 @@ def token2features(sent, i):
     return features
 
 def sent2features(sent):
-    return [token2features(sent, i) for i in range(len(sent))]
\ No newline at end of file
+    return [token2features(sent, i) for i in range(len(sent))]
+
+# --- Fast featurization (same features, computed once per token) ---
+import sys
+from functools import lru_cache
+
+# Interned feature names, shared by every feature dict instead of re-created per token
+W_LOWER, W_UPPER, W_TITLE, W_DIGIT = (sys.intern(k) for k in (
+    'word.lower()', 'word.isupper()', 'word.istitle()', 'word.isdigit()'))
+P_LOWER, P_TITLE, P_UPPER = (sys.intern(k) for k in (
+    '-1:word.lower()', '-1:word.istitle()', '-1:word.isupper()'))
+N_LOWER, N_TITLE, N_UPPER = (sys.intern(k) for k in (
+    '+1:word.lower()', '+1:word.istitle()', '+1:word.isupper()'))
+BOS, EOS = sys.intern('BOS'), sys.intern('EOS')
+
+
+def _token_attrs(token):
+    return token.lower(), token.isupper(), token.istitle(), token.isdigit()
+
+
+def sent2features_fast(sent):
+    """Identical output to sent2features, but lower()/isupper()/istitle() run once per token, not up to 3 times"""
+    attrs = [_token_attrs(tok[0]) for tok in sent]
+    last = len(attrs) - 1
+    features = []
+    for i, (lower, upper, title, digit) in enumerate(attrs):
+        f = {W_LOWER: lower, W_UPPER: upper, W_TITLE: title, W_DIGIT: digit}
+        if i > 0:
+            p = attrs[i-1]
+            f[P_LOWER] = p[0]; f[P_TITLE] = p[2]; f[P_UPPER] = p[1]
+        else:
+            f[BOS] = True
+        if i < last:
+            n = attrs[i+1]
+            f[N_LOWER] = n[0]; f[N_TITLE] = n[2]; f[N_UPPER] = n[1]
+        else:
+            f[EOS] = True
+        features.append(f)
+    return features
+
+
+@lru_cache(maxsize=65536)
+def _token_views(token):
+    """(own, as-previous, as-next) attribute tuples of a token; the vocabulary is small and repetitive"""
+    lower, upper, title, digit = _token_attrs(token)
+    own = (W_LOWER + ':' + lower,) + ((W_UPPER,) if upper else ()) + ((W_TITLE,) if title else ()) + ((W_DIGIT,) if digit else ())
+    as_prev = (P_LOWER + ':' + lower,) + ((P_TITLE,) if title else ()) + ((P_UPPER,) if upper else ())
+    as_next = (N_LOWER + ':' + lower,) + ((N_TITLE,) if title else ()) + ((N_UPPER,) if upper else ())
+    return own, as_prev, as_next
+
+
+def tokens2crfsuite(tokens):
+    """
+    Compact attribute lists for pycrfsuite's Tagger.tag(), e.g. crf.tagger_.tag(tokens2crfsuite(tokens)).
+    pycrfsuite turns {"word.lower()": "pay"} into the attribute "word.lower():pay" (weight 1) and a
+    False boolean into a weight-0 attribute, which never changes a score, so only true flags are kept.
+    """
+    views = [_token_views(token) for token in tokens]
+    last = len(tokens) - 1
+    return [
+        views[i][0] + (views[i-1][1] if i > 0 else (BOS,)) + (views[i+1][2] if i < last else (EOS,))
+        for i in range(len(tokens))
+    ]
@@ -0,0 +1,79 @@
+# transactions.py
+# Transaction history reads: date-range queries with keyset pagination on (user_id, transaction_date, id).
+#
+# Pages are ordered newest first by (transaction_date, id). The cursor is the last row's
+# (date, id), and the next page starts strictly below it, so every page is an index range scan
+# no matter how deep the client pages (OFFSET would re-read every skipped row).
+import base64
+import json
+
+from sqlalchemy import and_, or_, select
+
+from database import Transaction, AsyncSessionLocal
+from slot_rules import parse_date
+
+EXPORT_PAGE_SIZE = 500
+
+
+def encode_cursor(transaction):
+    raw = f"{transaction.transaction_date.isoformat()}:{transaction.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        day, _, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().partition(":")
+        return parse_date(day), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor {cursor!r}") from e
+
+
+def range_query(user_id, start=None, end=None, after=None, limit=50):
+    """SELECT for one page: rows of `user_id` within [start, end], below the `after` cursor."""
+    query = select(Transaction).where(Transaction.user_id == user_id)
+    if start:
+        query = query.where(Transaction.transaction_date >= start)
+    if end:
+        query = query.where(Transaction.transaction_date <= end)
+    if after:
+        day, row_id = after
+        query = query.where(or_(Transaction.transaction_date < day,
+                                and_(Transaction.transaction_date == day, Transaction.id < row_id)))
+    return query.order_by(Transaction.transaction_date.desc(), Transaction.id.desc()).limit(limit)
+
+
+async def fetch_page(db, user_id, start=None, end=None, cursor=None, limit=50):
+    """Returns (transactions, next_cursor); next_cursor is None on the last page."""
+    after = decode_cursor(cursor) if cursor else None
+    # One extra row tells whether another page exists without a COUNT(*)
+    rows = list(await db.scalars(range_query(user_id, start, end, after, limit + 1)))
+    page = rows[:limit]
+    return page, (encode_cursor(page[-1]) if len(rows) > limit else None)
+
+
+def to_dict(transaction):
+    return {
+        "id": transaction.id,
+        "date": transaction.transaction_date.isoformat() if transaction.transaction_date else None,
+        "description": transaction.description,
+        "amount": float(transaction.amount),
+        "type": transaction.transaction_type,
+        "category": transaction.category,
+    }
+
+
+async def export_ndjson(user_id, start=None, end=None, page_size=EXPORT_PAGE_SIZE):
+    """
+    Yields the whole range as NDJSON lines, one keyset page at a time, so memory stays flat
+    for years of history. Uses its own session: it outlives the request's dependencies.
+    """
+    async with AsyncSessionLocal() as db:
+        after = None
+        while True:
+            page = list(await db.scalars(range_query(user_id, start, end, after, page_size)))
+            if not page:
+                return
+            yield "".join(json.dumps(to_dict(t)) + "\n" for t in page)
+            if len(page) < page_size:
+                return
+            after = (page[-1].transaction_date, page[-1].id)
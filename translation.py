@@ -0,0 +1,154 @@
+# translation.py
+# Pluggable translation backends behind one async, cached, deadline-bound service.
+import asyncio
+import inspect
+import os
+
+from cache import LRUCache
+
+
+class TranslatorBackend:
+    """Backends implement translate(); translate_async() runs it off the event loop by default."""
+    name = "base"
+
+    def translate(self, text, src, dest):
+        raise NotImplementedError
+
+    async def translate_async(self, text, src, dest):
+        return await asyncio.to_thread(self.translate, text, src, dest)
+
+
+class GoogleTranslateBackend(TranslatorBackend):
+    """googletrans (network). Works with both the sync 3.x/4.0.0rc1 API and the async 4.0.2+ API."""
+    name = "google"
+
+    def __init__(self):
+        from googletrans import Translator
+        self._translator = Translator()
+        self._is_async = inspect.iscoroutinefunction(self._translator.translate)
+
+    def translate(self, text, src, dest):
+        if self._is_async:
+            return asyncio.run(self._translator.translate(text, src=src, dest=dest)).text
+        return self._translator.translate(text, src=src, dest=dest).text
+
+    async def translate_async(self, text, src, dest):
+        if self._is_async:
+            return (await self._translator.translate(text, src=src, dest=dest)).text
+        # Sync client: keep the network call off the event loop
+        return await asyncio.to_thread(self.translate, text, src, dest)
+
+
+class OfflineBackend(TranslatorBackend):
+    """
+    Local argos-translate models (pip install argostranslate, then install the hi<->en packages).
+    No network in the request path; latency is bounded by CPU only.
+    """
+    name = "offline"
+
+    def __init__(self):
+        import argostranslate.translate
+        self._argos = argostranslate.translate
+
+    def translate(self, text, src, dest):
+        return self._argos.translate(text, src, dest)
+
+
+class StubBackend(TranslatorBackend):
+    """Deterministic backend for tests: fixed phrase table, otherwise tags the text with the target language."""
+    name = "stub"
+
+    def __init__(self, phrases=None):
+        self.phrases = phrases or {}
+        self.calls = 0
+
+    def translate(self, text, src, dest):
+        self.calls += 1
+        return self.phrases.get((text, src, dest), f"[{dest}] {text}")
+
+    async def translate_async(self, text, src, dest):
+        return self.translate(text, src, dest)
+
+
+class NullBackend(TranslatorBackend):
+    """Leaves text untranslated (used when the configured backend cannot be loaded)."""
+    name = "none"
+
+    def translate(self, text, src, dest):
+        return text
+
+    async def translate_async(self, text, src, dest):
+        return text
+
+
+BACKENDS = {
+    "google": GoogleTranslateBackend,
+    "offline": OfflineBackend,
+    "stub": StubBackend,
+    "none": NullBackend,
+}
+
+
+class TranslationService:
+    """
+    - Bounded LRU keyed on (text, src, dest): repeated phrases never leave the process
+    - Every call has a deadline; on timeout or backend error the original text is returned
+      (the same fallback the old bare `except: pass` had, but bounded and logged)
+    """
+    def __init__(self, backend, cache_size=4096, timeout=2.0):
+        self.backend = backend
+        self.timeout = timeout
+        self.cache = LRUCache(cache_size)
+        self.timeouts = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls):
+        name = os.getenv("TRANSLATION_BACKEND", "google")
+        try:
+            backend = BACKENDS[name]()
+        except Exception as e:
+            print(f"⚠️ Translation backend '{name}' unavailable ({e}); requests will not be translated.")
+            backend = NullBackend()
+        return cls(
+            backend,
+            cache_size=int(os.getenv("TRANSLATION_CACHE_SIZE", 4096)),
+            timeout=float(os.getenv("TRANSLATION_TIMEOUT_S", 2.0)),
+        )
+
+    async def translate(self, text, src, dest, timeout=None):
+        if not text or src == dest:
+            return text
+        key = (text, src, dest)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        try:
+            translated = await asyncio.wait_for(
+                self.backend.translate_async(text, src, dest),
+                timeout=self.timeout if timeout is None else timeout,
+            )
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            print(f"⚠️ Translation timed out ({src}->{dest}); using original text.")
+            return text
+        except Exception as e:
+            self.errors += 1
+            print(f"⚠️ Translation failed ({src}->{dest}): {e}")
+            return text
+        self.cache.put(key, translated)
+        return translated
+
+    async def translate_many(self, texts, src, dest, timeout=None):
+        """Translates each distinct text once, concurrently; returns {text: translation}."""
+        unique = list(dict.fromkeys(texts))
+        results = await asyncio.gather(*(self.translate(t, src, dest, timeout) for t in unique))
+        return dict(zip(unique, results))
+
+    def stats(self):
+        return {"backend": self.backend.name, "timeouts": self.timeouts, "errors": self.errors,
+                "cache": self.cache.stats()}
+
+
+# Singleton instance (TRANSLATION_BACKEND=google|offline|stub|none)
+translator = TranslationService.from_env()
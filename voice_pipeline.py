@@ -0,0 +1,108 @@
+# voice_pipeline.py
+# Blocking voice stages, kept at module level so they can be shipped to a thread or process pool.
+import os
+import warnings
+
+import audio_decoder
+from voice_security import voice_guard
+from worker_pool import WorkerPool
+from whisper_batcher import WhisperBatcher
+from model_registry import registry
+
+warnings.filterwarnings("ignore", message="FP16 is not supported on CPU; using FP32 instead")
+
+
+def _load_whisper():
+    import whisper
+    # NOTE: Ensure you have the 'base' whisper model installed or change to 'tiny' for speed
+    return whisper.load_model(os.getenv("WHISPER_MODEL", "base"))
+
+
+# Whisper model for STT, loaded on first use (whisper_model.get())
+whisper_model = registry.register("whisper", _load_whisper)
+
+
+def decode_upload(file_obj):
+    # Bytes -> AudioFrame, decoded and resampled once per request (see audio_decoder)
+    return audio_decoder.decode_upload(file_obj)
+
+
+def verify_speaker(frame, user_id):
+    return voice_guard.get().verify_user(frame, user_id)
+
+
+def identify_speaker(frame):
+    return voice_guard.get().identify_user(frame)
+
+
+def transcribe(frame, task="transcribe", language=None):
+    # Whisper accepts the float32 array directly, so the frame is reused as-is.
+    # language=None lets Whisper detect it; task="translate" produces English in the same pass.
+    result = whisper_model.get().transcribe(frame.samples, task=task, language=language)
+    return {"text": result["text"], "language": result["language"]}
+
+
+# Speculative mode: start Whisper while speaker verification is still running and drop the
+# transcript if verification fails. Trades CPU (wasted transcriptions of rejected callers)
+# for latency (the two slowest stages overlap instead of adding up).
+SPECULATIVE_TRANSCRIBE = os.getenv("VOICE_SPECULATIVE_TRANSCRIBE", "0") == "1"
+
+
+# --- POOLS ---
+# I/O pool: upload decoding (threads, the GIL is released inside the codecs and ffmpeg pipe)
+# CPU pool: noise reduction, speaker embedding and Whisper (VOICE_CPU_KIND=process to use all cores;
+#           each worker process then imports this module and loads its own copy of the models)
+io_pool = WorkerPool.from_env("voice-io", "VOICE_IO", default_kind="thread")
+cpu_pool = WorkerPool.from_env("voice-cpu", "VOICE_CPU", default_kind="thread")
+
+# Whisper micro-batching (WHISPER_BATCH_SIZE=1 disables it and transcribes on cpu_pool instead)
+WHISPER_BATCH_SIZE = int(os.getenv("WHISPER_BATCH_SIZE", 8))
+WHISPER_BATCH_MAX_WAIT_MS = float(os.getenv("WHISPER_BATCH_MAX_WAIT_MS", 10))
+batcher = None
+if WHISPER_BATCH_SIZE > 1:
+    batcher = WhisperBatcher(
+        whisper_model,
+        max_batch_size=WHISPER_BATCH_SIZE,
+        max_wait_ms=WHISPER_BATCH_MAX_WAIT_MS,
+        max_queue=int(os.getenv("WHISPER_BATCH_QUEUE", WHISPER_BATCH_SIZE * 8)),
+    )
+
+
+def transcribe_async(frame, task="transcribe", language=None):
+    """Awaitable transcription: batched when the batcher is on, otherwise one call on cpu_pool."""
+    if batcher:
+        return batcher.run(frame, task, language)
+    return cpu_pool.run(transcribe, frame, task, language)
+
+
+def language_hint(language):
+    """Client locale ("hi-IN", "en-US", "auto") -> Whisper language code, None = auto-detect."""
+    if not language or language == "auto":
+        return None
+    return language.split("-")[0].lower()
+
+
+# Whisper language code -> locale used for the response catalog / translator
+LOCALES = {"en": "en-US", "hi": "hi-IN"}
+
+
+def response_locale(requested, detected):
+    """Answers in the client's language when it named one, otherwise in the language spoken."""
+    if requested and requested != "auto":
+        return requested
+    return LOCALES.get(detected, detected)
+
+
+async def speech_to_text(frame, language=None):
+    """
+    Returns {"text": original-language transcript, "language": detected code,
+             "translation": English text or None when the speech already is English}.
+    The English text comes from Whisper's translate task, so NLU needs no separate translation hop.
+    """
+    original = await transcribe_async(frame, "transcribe", language)
+    detected = original["language"]
+    translation = None
+    if detected != "en":
+        translated = await transcribe_async(frame, "translate", detected)
+        translation = translated["text"].strip()
+    return {"text": original["text"].strip(), "language": detected, "translation": translation}
@@ -1,27 +1,16 @@
 # voice_security.py
-import io
 import numpy as np
-from resemblyzer import VoiceEncoder, preprocess_wav
 from numpy.linalg import norm
-import noisereduce as nr
-import librosa
-import subprocess
 import soundfile as sf
 from pathlib import Path
-import os
-from database import User, get_db_session # Import User model and session helper
-
-def deserialize_embedding(binary_data):
-    """Converts binary data from the database back to a numpy array (embedding)."""
-    if not binary_data: return None
-    with io.BytesIO(binary_data) as f:
-        # numpy.load expects a file-like object
-        return np.load(f)
-
+from embedding_cache import embedding_cache # Cached, pre-normalized enrolled embeddings
+from speaker_index import speaker_index # All enrolled embeddings, for 1:N identification
+from model_registry import registry
 
 class VoiceSecurity:
     def __init__(self):
-        print("Loading Voice Encoder...")
+        # resemblyzer pulls in torch, so it is only imported when the encoder is first needed
+        from resemblyzer import VoiceEncoder
         self.encoder = VoiceEncoder()
 
 
@@ -33,16 +22,15 @@ class VoiceSecurity:
         amplified = audio * gain
         return np.clip(amplified, -1.0, 1.0)
 
-    def clean_audio(self, file_path):
-        # Load audio at 16k sample rate
-       
-        audio_np, sr = librosa.load(file_path, sr=16000)
+    def clean_audio(self, audio_np, sr=16000):
+        # Expects the 16 kHz mono float32 buffer produced by audio_decoder
         
         # Normalize
         audio_np = audio_np / (np.max(np.abs(audio_np)) + 1e-8)
         
-        # Reduce Noise
+        # Reduce Noise (noisereduce imports torch, so it is only imported when audio is cleaned)
         if len(audio_np) > 4000:
+            import noisereduce as nr
             noise_sample = audio_np[:4000]
             cleaned = nr.reduce_noise(y=audio_np, y_noise=noise_sample, sr=sr, prop_decrease=0.8)
         else:
@@ -50,57 +38,30 @@ class VoiceSecurity:
             
         return self.amplify_audio(cleaned)
 
-    def verify_user(self, input_audio_path, user_id, threshold=0.75):
+    def embed(self, frame):
+        """Cleans the frame and returns its L2-normalized speaker embedding."""
+        from resemblyzer import preprocess_wav
+        cleaned_audio = self.clean_audio(frame.samples, frame.sample_rate)
+        wav = preprocess_wav(cleaned_audio)
+        embedding = self.encoder.embed_utterance(wav)
+        return embedding / norm(embedding)
+
+    def verify_user(self, frame, user_id, threshold=0.75):
         """
+        Expects the request's AudioFrame (see audio_decoder.decode_upload).
         Returns (is_verified: bool, score: float, message: str)
         """
-        wav_path = "converted_input.wav"
-
-        try:
-            subprocess.run([
-                "ffmpeg", "-y",
-                "-i", input_audio_path,
-                "-vn",
-                "-acodec", "pcm_s16le",
-                "-ar", "16000",
-                "-ac", "1",
-                wav_path
-            ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-        # Ensure file actually exists
-            if not os.path.exists(wav_path):
-                return False, 0.0, "FFmpeg failed: WAV file not generated."
-
-        except Exception as e:
-            return False, 0.0, f"FFmpeg error: {str(e)}"
-
         # Mapping "user" string to DB ID 1 for demo consistency with main.py
         db_id = 1
         
-        db = get_db_session()
-        user = db.query(User).filter(User.id == db_id).first()
-        
-        if not user:
-            db.close()
-            return False, 0.0, f"Error: User ID {db_id} not found in database."
-        
-        # 1. Retrieve embedding from DB and deserialize
-        binary_embed = user.voice_embedding
-        db.close()
-        
-        if not binary_embed:
-            return False, 0.0, "No reference voice embedding found in database."
-            
-        mean_embed = deserialize_embedding(binary_embed)
-        # Normalize the mean embedding retrieved from DB
-        mean_embed = mean_embed / norm(mean_embed)
+        # 1. Retrieve the enrolled embedding (cached, already normalized)
+        mean_embed, error = embedding_cache.lookup(db_id)
+        if mean_embed is None:
+            return False, 0.0, error
 
         try:
             # 2. Preprocess the incoming audio
-            cleaned_audio = self.clean_audio(wav_path)
-            wav = preprocess_wav(cleaned_audio)
-            embedding_new = self.encoder.embed_utterance(wav)
-            embedding_new = embedding_new / norm(embedding_new)
+            embedding_new = self.embed(frame)
 
             # 3. Compute Cosine Similarity
             score = np.dot(mean_embed, embedding_new)
@@ -110,5 +71,21 @@ class VoiceSecurity:
         except Exception as e:
             return False, 0.0, f"Error during verification: {str(e)}"
 
-# Singleton instance
-voice_guard = VoiceSecurity()
\ No newline at end of file
+    def identify_user(self, frame, top_k=3, threshold=0.75):
+        """
+        1:N identification against every enrolled user (see speaker_index).
+        Returns (user_id or None, score: float, candidates: [(user_id, score), ...])
+        """
+        speaker_index.sync_from_db()
+        try:
+            candidates = speaker_index.identify(self.embed(frame), top_k=top_k)
+        except Exception as e:
+            print(f"Error during identification: {e}")
+            return None, 0.0, []
+        if not candidates:
+            return None, 0.0, []
+        best_id, best_score = candidates[0]
+        return (best_id if best_score >= threshold else None), best_score, candidates
+
+# Singleton instance, built on first use (voice_guard.get())
+voice_guard = registry.register("voice_encoder", VoiceSecurity)
\ No newline at end of file
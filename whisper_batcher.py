@@ -0,0 +1,171 @@
+# whisper_batcher.py
+# Dynamic micro-batching: concurrent utterances share one Whisper encoder/decoder pass.
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from worker_pool import PoolSaturated
+
+# Same thresholds whisper.transcribe uses to decide a greedy decode went wrong
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+
+
+class _Pending:
+    __slots__ = ("samples", "task", "language", "future", "submitted")
+
+    def __init__(self, samples, task, language):
+        self.samples = samples
+        self.task = task          # "transcribe" or "translate" (to English)
+        self.language = language  # None = detect
+        self.future = Future()
+        self.submitted = time.monotonic()
+
+
+class WhisperBatcher:
+    """
+    Collects pending utterances for up to max_wait_ms (or until max_batch_size is reached),
+    pads each to Whisper's 30 s window, stacks the log-mel spectrograms and runs a single
+    batched whisper.decode per (task, language) group; language detection for items without a
+    language runs inside the same batched pass. Utterances longer than 30 s, and greedy results
+    that look like failures (repetition / low log-prob), are re-run through whisper.transcribe.
+    Futures resolve to {"text": ..., "language": ...}.
+    `model` is a model_registry.LazyModel, resolved on the batching thread at the first batch.
+    """
+    def __init__(self, model, max_batch_size=8, max_wait_ms=10, max_queue=64):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue = max_queue
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._fallbacks = 0
+        self._wait_total = 0.0
+        self._last_batch_ms = 0.0
+
+        # Started on first use, in the process that uses it: a thread started before a
+        # gunicorn fork (serve.py) would not exist in the workers
+        self._thread = None
+        self._pid = None
+
+    def _ensure_thread(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._thread = threading.Thread(target=self._loop, name="whisper-batcher", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def submit(self, samples, task="transcribe", language=None):
+        """Queues a 16 kHz float32 utterance and returns a concurrent.futures.Future[dict]."""
+        if self._queue.qsize() >= self.max_queue:
+            retry_after = max(1, round(self._last_batch_ms / 1000 * (self._queue.qsize() / self.max_batch_size)))
+            raise PoolSaturated("whisper-batcher", retry_after)
+        self._ensure_thread()
+        pending = _Pending(samples, task, language)
+        self._queue.put(pending)
+        return pending.future
+
+    async def run(self, frame, task="transcribe", language=None):
+        """Async wrapper used by the endpoints; cancelling it drops the utterance if not yet batched."""
+        return await asyncio.wrap_future(self.submit(frame.samples, task, language))
+
+    def _collect(self):
+        batch = []
+        first = self._queue.get()
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            # Skip requests cancelled while waiting (e.g. failed speculative verification)
+            if first.future.set_running_or_notify_cancel():
+                batch.append(first)
+            if len(batch) >= self.max_batch_size:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                first = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            if not batch:
+                continue
+            start = time.perf_counter()
+            queued = sum(time.monotonic() - item.submitted for item in batch)
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+            with self._lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._wait_total += queued
+                self._last_batch_ms = (time.perf_counter() - start) * 1000
+
+    def _transcribe_single(self, item):
+        with self._lock:
+            self._fallbacks += 1
+        try:
+            result = self.model.get().transcribe(item.samples, task=item.task, language=item.language)
+        except Exception as e:
+            item.future.set_exception(e)
+        else:
+            item.future.set_result({"text": result["text"], "language": result["language"]})
+
+    def _run_batch(self, batch):
+        import torch
+        import whisper
+
+        model = self.model.get()
+        short = [item for item in batch if len(item.samples) <= whisper.audio.N_SAMPLES]
+        for item in batch:
+            if len(item.samples) > whisper.audio.N_SAMPLES:
+                self._transcribe_single(item)
+        if not short:
+            return
+
+        groups = {}
+        for item in short:
+            groups.setdefault((item.task, item.language), []).append(item)
+
+        for (task, language), items in groups.items():
+            mels = torch.stack([
+                whisper.log_mel_spectrogram(whisper.pad_or_trim(item.samples), n_mels=model.dims.n_mels)
+                for item in items
+            ]).to(model.device)
+            options = whisper.DecodingOptions(task=task, language=language, fp16=False, without_timestamps=True)
+            results = whisper.decode(model, mels, options)
+
+            for item, result in zip(items, results):
+                if result.compression_ratio > COMPRESSION_RATIO_THRESHOLD or result.avg_logprob < LOGPROB_THRESHOLD:
+                    # Let transcribe() retry with its temperature fallback
+                    self._transcribe_single(item)
+                else:
+                    item.future.set_result({"text": result.text, "language": result.language})
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "utterances": self._items,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "avg_wait_ms": round(1000 * self._wait_total / self._items, 2) if self._items else 0.0,
+                "fallbacks": self._fallbacks,
+                "last_batch_ms": round(self._last_batch_ms, 1),
+            }
@@ -0,0 +1,157 @@
+# worker_pool.py
+import asyncio
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+class PoolSaturated(Exception):
+    """Raised when a pool has no free worker and its wait queue is full."""
+    def __init__(self, pool_name, retry_after):
+        super().__init__(f"Worker pool '{pool_name}' is saturated.")
+        self.pool_name = pool_name
+        self.retry_after = retry_after
+
+
+def _timed_call(fn, args):
+    # Runs inside the worker (thread or process). time.monotonic() is system-wide on
+    # Linux, so the start stamp is comparable with the submit stamp taken in the parent.
+    started = time.monotonic()
+    return started, fn(*args)
+
+
+class WorkerPool:
+    """
+    Bounded executor for blocking work called from async endpoints.
+    - kind="thread" for I/O (ffmpeg, file writes), kind="process" for CPU-bound model work
+    - At most max_workers tasks run and max_queue tasks wait; anything beyond that is
+      rejected with PoolSaturated so the API can answer 503 + Retry-After.
+    """
+    def __init__(self, name, kind="thread", max_workers=None, max_queue=None, initializer=None):
+        self.name = name
+        self.kind = kind
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = self.max_workers * 2 if max_queue is None else max_queue
+
+        if kind == "process":
+            # 'spawn' avoids forking a parent that already has torch/OpenMP threads running
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=initializer,
+            )
+        elif kind == "thread":
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix=name,
+                initializer=initializer,
+            )
+        else:
+            raise ValueError(f"Unknown worker pool kind: {kind}")
+
+        self._lock = threading.Lock()
+        self._pending = 0      # running + waiting
+        self._completed = 0
+        self._rejected = 0
+        self._cancelled = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._service_avg = 0.0  # moving average of task run time, used for Retry-After
+
+    @classmethod
+    def from_env(cls, name, prefix, default_kind="thread", initializer=None):
+        """Builds a pool from <PREFIX>_KIND, <PREFIX>_WORKERS and <PREFIX>_QUEUE."""
+        workers = os.getenv(f"{prefix}_WORKERS")
+        queue = os.getenv(f"{prefix}_QUEUE")
+        return cls(
+            name,
+            kind=os.getenv(f"{prefix}_KIND", default_kind),
+            max_workers=int(workers) if workers else None,
+            max_queue=int(queue) if queue else None,
+            initializer=initializer,
+        )
+
+    def is_saturated(self):
+        return self._pending >= self.max_workers + self.max_queue
+
+    def retry_after(self):
+        """Rough number of seconds until a slot frees up."""
+        with self._lock:
+            waiting = max(self._pending - self.max_workers, 0) + 1
+            service = self._service_avg or 1.0
+        return max(1, math.ceil(waiting * service / self.max_workers))
+
+    def check_capacity(self):
+        if self.is_saturated():
+            with self._lock:
+                self._rejected += 1
+            raise PoolSaturated(self.name, self.retry_after())
+
+    async def run(self, fn, *args):
+        """
+        Runs fn(*args) on the pool and awaits the result without blocking the event loop.
+        Cancelling the awaiting task cancels the work if it has not started yet; work that
+        is already running finishes and its result is dropped.
+        """
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                saturated = True
+            else:
+                self._pending += 1
+                saturated = False
+        if saturated:
+            raise PoolSaturated(self.name, self.retry_after())
+
+        submitted = time.monotonic()
+        try:
+            future = self._executor.submit(_timed_call, fn, args)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        # Release the slot when the work really ends, not when the awaiting coroutine is
+        # cancelled: a cancelled task may still be running on a worker.
+        future.add_done_callback(lambda f: self._task_done(f, submitted))
+        _, result = await asyncio.wrap_future(future)
+        return result
+
+    def _task_done(self, future, submitted):
+        finished = time.monotonic()
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled():
+                self._cancelled += 1
+                return
+            if future.exception() is not None:
+                return
+            started = future.result()[0]
+            wait = max(started - submitted, 0.0)
+            self._completed += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            service = finished - started
+            self._service_avg = service if not self._service_avg else 0.8 * self._service_avg + 0.2 * service
+
+    def stats(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "kind": self.kind,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._pending,
+                "queue_depth": max(self._pending - self.max_workers, 0),
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "cancelled": self._cancelled,
+                "avg_wait_ms": round(1000 * self._wait_total / self._completed, 2) if self._completed else 0.0,
+                "max_wait_ms": round(1000 * self._wait_max, 2),
+                "avg_service_ms": round(1000 * self._service_avg, 2),
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)